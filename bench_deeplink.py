@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check deeplink.parse_link against a table of known URL forms, then time
+it (cold and memoized) against the old split-based extraction.
+Exits non-zero if any table entry parses differently.
+
+    python bench_deeplink.py --iterations 200000
+"""
+
+import argparse
+import sys
+import time
+
+from deeplink import KIND_LINK, KIND_START, KIND_STARTAPP, DeepLink, parse_link
+
+# url -> expected DeepLink (or None)
+CASES = [
+    ("https://t.me/CryptoBot?start=CQabc123", DeepLink("cryptobot", None, "CQabc123", KIND_START)),
+    ("http://t.me/send?start=CQxyz", DeepLink("send", None, "CQxyz", KIND_START)),
+    ("t.me/wallet?start=C-AbC", DeepLink("wallet", None, "C-AbC", KIND_START)),
+    ("https://www.t.me/wallet?start=c_1", DeepLink("wallet", None, "c_1", KIND_START)),
+    ("https://telegram.me/xJetSwapBot?start=c_9f", DeepLink("xjetswapbot", None, "c_9f", KIND_START)),
+    ("https://telegram.dog/tonRocketBot?start=mci_1", DeepLink("tonrocketbot", None, "mci_1", KIND_START)),
+    ("https://t.me/wallet?startapp=mup_2", DeepLink("wallet", None, "mup_2", KIND_STARTAPP)),
+    ("https://t.me/wallet/start?startapp=CQ7", DeepLink("wallet", "start", "CQ7", KIND_STARTAPP)),
+    ("https://t.me/giftbot/app?startapp=gift_1&mode=compact", DeepLink("giftbot", "app", "gift_1", KIND_STARTAPP)),
+    ("https://t.me/bot_name?ref=1&start=code", DeepLink("bot_name", None, "code", KIND_START)),
+    ("https://t.me/bot_name?restart=1", DeepLink("bot_name", None, None, KIND_LINK)),
+    ("https://t.me/CryptoBot?start=CQ%2Babc", DeepLink("cryptobot", None, "CQ+abc", KIND_START)),
+    ("https://t.me/CryptoBot/?start=CQ1#frag", DeepLink("cryptobot", None, "CQ1", KIND_START)),
+    ("tg://resolve?domain=CryptoBot&start=CQ5", DeepLink("cryptobot", None, "CQ5", KIND_START)),
+    ("tg://resolve?domain=wallet&appname=start&startapp=x1", DeepLink("wallet", "start", "x1", KIND_STARTAPP)),
+    ("tg://resolve?domain=somechannel", DeepLink("somechannel", None, None, KIND_LINK)),
+    ("https://t.me/some_channel", DeepLink("some_channel", None, None, KIND_LINK)),
+    ("https://t.me/some_channel/123", DeepLink("some_channel", None, None, KIND_LINK)),
+    ("https://t.me/?start=abc", DeepLink(None, None, "abc", KIND_START)),
+    ("https://t.me/joinchat/AAAAE", None),
+    ("https://t.me/+AbCdEf", None),
+    ("https://t.me/c/12345/67", None),
+    ("https://t.me/addstickers/pack", None),
+    ("https://example.com/?start=abc", DeepLink(None, None, "abc", KIND_START)),
+    ("https://example.com/page", None),
+    ("https://notat.me/bot?start=x", DeepLink(None, None, "x", KIND_START)),
+    ("", None),
+]
+
+
+def legacy_parse(url: str):
+    """The split chain plan_buttons used before deeplink.py (for timing)."""
+    url = url.lower()
+    start_param = target_bot = None
+    if "start=" in url:
+        start_param = url.split("start=")[1].split("&")[0]
+    elif "startapp=" in url:
+        start_param = url.split("startapp=")[1].split("&")[0]
+    if "t.me/" in url:
+        target_bot = url.split("t.me/")[1].split("?")[0].replace("/", "")
+    elif "tg://resolve" in url:
+        target_bot = url.split("domain=")[1].split("&")[0]
+    return target_bot, start_param
+
+
+def check() -> int:
+    failures = 0
+    for url, expected in CASES:
+        got = parse_link(url)
+        if got != expected:
+            failures += 1
+            print(f"FAIL {url!r}\n     expected {expected}\n     got      {got}")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases ok")
+    return failures
+
+
+def timed(func, urls: list, iterations: int) -> float:
+    """Mean ns per call."""
+    n = len(urls)
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(urls[i % n])
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Deep-link parser table check and microbenchmark")
+    parser.add_argument("--iterations", type=int, default=200000, help="calls per variant")
+    args = parser.parse_args()
+
+    failures = check()
+    urls = [url for url, _ in CASES if url]
+    cold = parse_link.__wrapped__
+
+    print(f"legacy split chain {timed(legacy_parse, urls, args.iterations):8.0f}ns/url")
+    print(f"parse_link (cold)  {timed(cold, urls, args.iterations):8.0f}ns/url")
+    parse_link.cache_clear()
+    print(f"parse_link (LRU)   {timed(parse_link, urls, args.iterations):8.0f}ns/url")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
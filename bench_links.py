@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check links.extract_links against a table of posts (text links, hidden
+links, repeats, links already on a button), then time it on plain and
+link-heavy posts of growing length against a per-post regex scan of the
+lowercased text. Exits non-zero if any table entry differs.
+
+    python bench_links.py --iterations 20000
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from telethon.tl.types import MessageEntityTextUrl, MessageEntityUrl
+
+from fake_telegram import FakeButton
+from links import extract_links
+
+
+def entity_for(text: str, anchor: str, url: str) -> MessageEntityTextUrl:
+    """Hidden link over the first occurrence of anchor (UTF-16 offsets)."""
+    start = text.index(anchor)
+    offset = len(text[:start].encode("utf-16-le")) // 2
+    return MessageEntityTextUrl(offset, len(anchor.encode("utf-16-le")) // 2, url)
+
+
+HIDDEN = "🎁 Забирайте чек 👉 ЗДЕСЬ"
+
+# (text, entities, keyboard rows) -> expected [(anchor text, url)]
+CASES = [
+    ("Чек: t.me/CryptoBot?start=c_abc.", None, None,
+     [("", "t.me/CryptoBot?start=c_abc")]),
+    ("https://t.me/send?start=c_1 и https://telegram.me/send?start=c_1", None, None,
+     [("", "https://t.me/send?start=c_1")]),
+    ("(tg://resolve?domain=wallet&start=t6_9)", None, None,
+     [("", "tg://resolve?domain=wallet&start=t6_9")]),
+    (HIDDEN, [entity_for(HIDDEN, "ЗДЕСЬ", "https://t.me/xJetSwapBot?start=c_x")], None,
+     [("ЗДЕСЬ", "https://t.me/xJetSwapBot?start=c_x")]),
+    ("Жми t.me/send?start=c_2", None, [[FakeButton("Получить", "https://t.me/send?start=c_2")]], []),
+    ("Канал t.me/some_channel и пост t.me/some_channel/15", None, None, []),
+    ("Ссылка notat.me/bot?start=c_3", None, None, []),
+    ("Сайт https://example.com/a/b?start=c_4", [MessageEntityUrl(6, 30)], None, []),
+    ("Обычный пост без ссылок", None, None, []),
+    ("", None, None, []),
+]
+
+NAIVE_RE = re.compile(r"(?:https?://)?(?:t|telegram)\.(?:me|dog)/\S+|tg://resolve\?\S+")
+
+
+def naive_scan(text: str):
+    """Lowercase the whole post and regex it, whatever it contains."""
+    return NAIVE_RE.findall(text.lower())
+
+
+def check() -> int:
+    failures = 0
+    for text, entities, rows, expected in CASES:
+        got = [(link.text, link.url) for link in extract_links(text, entities, rows)]
+        if got != expected:
+            failures += 1
+            print(f"FAIL {text!r}\n     expected {expected}\n     got      {got}")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases ok")
+    return failures
+
+
+def timed(func, text: str, iterations: int) -> float:
+    """Mean ns per call."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(text)
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Text link scanner table check and microbenchmark")
+    parser.add_argument("--iterations", type=int, default=20000, help="calls per variant and length")
+    args = parser.parse_args()
+
+    failures = check()
+    posts = {
+        "plain": "Обычный пост канала, сегодня без подарков. ",
+        "with urls": "Читайте https://example.com/news и смотрите https://youtu.be/x. ",
+    }
+    print(f"{'post':<10} {'chars':>6} {'extract_links':>14} {'naive regex':>12}")
+    for name, chunk in posts.items():
+        for repeat in (2, 20, 100):
+            text = chunk * repeat
+            fast = timed(lambda t: extract_links(t, None), text, args.iterations)
+            naive = timed(naive_scan, text, args.iterations)
+            print(f"{name:<10} {len(text):>6} {fast:>12.0f}ns {naive:>10.0f}ns")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
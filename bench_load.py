@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end load test without a Telegram account: synthetic channel posts
+are offered at a fixed rate and dispatched one at a time through
+setup_handlers -> worker pool -> process_message -> smart_claim on a
+FakeClient with RPC latency, errors and FloodWait injection. Reports
+achieved throughput, event-loop lag, task count, queue depth, claim
+latency and memory.
+
+    python bench_load.py --rate 5000 --duration 10 --checks 0.01 --latency 80
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import math
+import os
+import random
+import resource
+import time
+
+import main
+from fake_telegram import FakeButton, FakeClient, FakeEvent, FakeMessage
+from scheduler import Scheduler
+
+# Event-loop lag / task count sampling period
+SAMPLE_INTERVAL = 0.05
+# Generator tick: posts for each tick are dispatched in one burst
+TICK = 0.01
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    idx = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[idx]
+
+
+def rss_mb() -> float:
+    """Current resident set size (falls back to peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PostFactory:
+    """Channel posts: mostly plain text, some with a link keyboard, a share
+    with a check (/start code or callback) that smart_claim will send."""
+
+    def __init__(self, client: FakeClient, channels: list, checks: float,
+                 buttons: float, repeat_codes: float, seed: int = 1):
+        self.client = client
+        self.channels = channels
+        self.checks = checks
+        self.buttons = buttons
+        self.repeat_codes = repeat_codes
+        self.rng = random.Random(seed)
+        self.msg_id = 0
+        self.link_row = [[FakeButton("Подписаться", "https://t.me/some_channel")]]
+
+    def make(self) -> FakeEvent:
+        self.msg_id += 1
+        roll = self.rng.random()
+        if roll < self.checks:
+            code = self.rng.randrange(50) if self.rng.random() < self.repeat_codes else self.msg_id
+            if self.rng.random() < 0.5:
+                rows = [[FakeButton("🎁 Получить", f"https://t.me/CryptoBot?start=c_{code:08x}")]]
+            else:
+                rows = [[FakeButton("🎁 Забрать подарок", data=f"claim:{code}".encode())]]
+        elif roll < self.checks + self.buttons:
+            rows = self.link_row
+        else:
+            rows = None
+        message = FakeMessage(self.msg_id, text="Обычный пост канала", buttons=rows)
+        return FakeEvent(self.rng.choice(self.channels), message, self.client)
+
+
+async def sample(samples: list, updates: asyncio.Queue, stop: asyncio.Event):
+    """(loop lag, live tasks, main queue depth, undispatched updates) every
+    SAMPLE_INTERVAL."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        lag = time.perf_counter() - started - SAMPLE_INTERVAL
+        samples.append((max(0.0, lag), len(asyncio.all_tasks()), main._scheduler.depth(),
+                        updates.qsize()))
+
+
+async def generate(factory: PostFactory, rate: float, duration: float,
+                   updates: asyncio.Queue) -> int:
+    """Offer rate posts/s for duration seconds into the update queue, as
+    the network reader does whatever the handlers are up to. Returns the
+    number of posts offered."""
+    offered = 0
+    started = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now - started >= duration:
+            return offered
+        due = int((now - started) * rate) - offered
+        for _ in range(due):
+            updates.put_nowait(factory.make())
+        offered += max(0, due)
+        await asyncio.sleep(TICK)
+
+
+async def dispatch_updates(client: FakeClient, updates: asyncio.Queue):
+    """One update at a time, like Telethon with sequential_updates=True:
+    a handler waiting for queue space holds back everything behind it."""
+    while True:
+        event = await updates.get()
+        try:
+            await client.dispatch(event)
+        finally:
+            updates.task_done()
+
+
+async def run(args) -> dict:
+    channels = [-(1000000000000 + i) for i in range(1, args.channels + 1)]
+    main.RAW_PREFILTER = False  # FakeClient dispatches built events only
+    main.TARGET_CHANNELS = channels
+    main.set_monitored(channels)
+    for peer_id in channels:
+        main._chat_titles[peer_id] = f"Channel {peer_id}"
+
+    client = FakeClient(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                        error_rate=args.error_rate, flood_rate=args.flood_rate,
+                        record=False, seed=2)
+    main._client = client
+    main.setup_handlers(client)
+    main._scheduler = Scheduler(workers=args.workers, max_queue=args.queue, cheap_queue=args.queue,
+                                on_wait=lambda lane, us: main.metrics.observe("queue_wait", (lane,), us))
+    main._scheduler.start()
+    factory = PostFactory(client, channels, args.checks, args.buttons, args.repeat_codes)
+
+    gc.collect()
+    rss_before = rss_mb()
+    samples: list = []
+    updates: asyncio.Queue = asyncio.Queue()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample(samples, updates, stop))
+    dispatcher = asyncio.create_task(dispatch_updates(client, updates))
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    offered = await generate(factory, args.rate, args.duration, updates)
+    generated = time.perf_counter()
+    await updates.join()
+    dispatcher.cancel()
+    await main._scheduler._queue.join()
+    await main._scheduler._cheap.join()
+    finished = time.perf_counter()
+    cpu = time.process_time() - cpu_started
+    stop.set()
+    await sampler
+    rss_after = rss_mb()
+    await main._scheduler.stop()
+
+    return {
+        "offered": offered,
+        "processed": main.stats.messages_total,
+        "generated_s": generated - started,
+        "drain_s": finished - generated,
+        "elapsed_s": finished - started,
+        "cpu_s": cpu,
+        "samples": samples,
+        "client": client,
+        "counters": main._scheduler.counters(),
+        "rss": (rss_before, rss_after, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Flood the claimer with synthetic posts over a fake client")
+    parser.add_argument("--rate", type=float, default=5000, help="posts per second offered")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--channels", type=int, default=200, help="monitored channels")
+    parser.add_argument("--checks", type=float, default=0.01, help="share of posts with a check button")
+    parser.add_argument("--buttons", type=float, default=0.05, help="share of posts with a plain link keyboard")
+    parser.add_argument("--repeat-codes", type=float, default=0.0, help="share of checks reusing a recent code")
+    parser.add_argument("--latency", type=float, default=50, help="RPC latency, ms")
+    parser.add_argument("--jitter", type=float, default=20, help="extra random RPC latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of RPCs failing")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of RPCs raising FloodWaitError")
+    parser.add_argument("--workers", type=int, default=main.WORKERS, help="worker pool size")
+    parser.add_argument("--queue", type=int, default=main.WORK_QUEUE_SIZE, help="worker queue size")
+    parser.add_argument("--verbose", action="store_true", help="keep claimer logging enabled")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    r = asyncio.run(run(args))
+    lags = sorted(lag * 1000 for lag, _, _, _ in r["samples"])
+    tasks = [n for _, n, _, _ in r["samples"]]
+    depths = [d for _, _, d, _ in r["samples"]]
+    backlog = [b for _, _, _, b in r["samples"]]
+    client = r["client"]
+    c = r["counters"]
+    acked = main.metrics.merged("claim_stage", stage="acked")
+    waited = main.metrics.merged("queue_wait", lane="main")
+    rss_before, rss_after, rss_peak = r["rss"]
+
+    print("=" * 60)
+    print(f"Offered:    {r['offered']} posts at {args.rate:.0f}/s for {args.duration:.0f}s "
+          f"({args.checks * 100:.1f}% checks, RPC {args.latency:.0f}+{args.jitter:.0f}ms)")
+    print(f"Processed:  {r['processed']} posts, {r['processed'] / r['elapsed_s']:.0f}/s "
+          f"(drain after load {r['drain_s']:.2f}s), CPU {r['cpu_s'] * 1e6 / max(1, r['processed']):.1f}us/post")
+    print(f"Dropped:    {c['dropped']} button-less (cheap lane full), {c['blocked']} waited for queue space")
+    print(f"Claims:     {main.stats.gifts_claimed} ok, {main.stats.gifts_failed} failed "
+          f"({client.errors} RPC errors, {client.floods} FloodWait), "
+          f"{main.stats.duplicates_skipped} duplicates")
+    print("RPCs:       " + ", ".join(f"{kind} {n}" for kind, n in sorted(client.counts.items())))
+    print("-" * 60)
+    print(f"Loop lag:   p50 {percentile(lags, 50):.1f}ms  p99 {percentile(lags, 99):.1f}ms  "
+          f"max {lags[-1] if lags else 0:.1f}ms")
+    print(f"Tasks:      max {max(tasks, default=0)}  mean {sum(tasks) / max(1, len(tasks)):.0f}")
+    print(f"Queue:      max depth {max(depths, default=0)} / {args.queue}, "
+          f"updates not yet dispatched max {max(backlog, default=0)}")
+    if waited.count:
+        print(f"Worker wait p50 {waited.percentile(50) / 1000:.1f}ms  p99 {waited.percentile(99) / 1000:.1f}ms")
+    if acked.count:
+        print(f"Claim acked p50 {acked.percentile(50) / 1000:.1f}ms  p99 {acked.percentile(99) / 1000:.1f}ms")
+    print(f"Memory:     RSS {rss_before:.1f} -> {rss_after:.1f}MB (peak {rss_peak:.1f}MB)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare CPU per channel post for the two update paths: events.NewMessage
+for every post (RAW_PREFILTER=0) and the raw UpdateNewChannelMessage
+prefilter (RAW_PREFILTER=1). Synthetic updates go through Telethon's real
+dispatcher on an offline client; keyboards hold plain links, so no RPC is
+ever attempted.
+
+    python bench_prefilter.py --count 20000 --buttons 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+from telethon.tl import types
+
+import main
+from scheduler import Scheduler
+
+SELF_ID = 777000001
+CHANNEL_IDS = [1000000001 + i for i in range(20)]
+
+
+def url_markup(text: str, url: str):
+    """Inline keyboard with one link button, for old and new TL layers."""
+    if hasattr(types, "KeyboardButtonUrl"):
+        row = types.KeyboardButtonRow([types.KeyboardButtonUrl(text, url)])
+    else:
+        row = types.KeyboardInlineButtonRow([
+            types.KeyboardInlineButton(text, types.InlineButtonTypeUrl(url))])
+    return types.ReplyInlineMarkup([row])
+
+
+def make_updates(count: int, button_share: float, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    markup = url_markup("Подписаться", "https://t.me/some_channel")
+    updates = []
+    for i in range(1, count + 1):
+        message = types.Message(
+            id=i,
+            peer_id=types.PeerChannel(rng.choice(CHANNEL_IDS)),
+            date=now,
+            message="Обычный пост канала " * rng.randint(1, 20),
+            post=True,
+            reply_markup=markup if rng.random() < button_share else None,
+        )
+        update = types.UpdateNewChannelMessage(message, pts=i, pts_count=1)
+        update._entities = {}
+        updates.append(update)
+    return updates
+
+
+def make_client() -> TelegramClient:
+    client = TelegramClient(StringSession(), 1, "0" * 32)
+    client._mb_entity_cache.set_self_user(SELF_ID, False, 0)
+    # Real updates carry their channels, which land in the entity cache
+    client._mb_entity_cache.extend([], [
+        types.Channel(id=cid, title=f"Channel {cid}", photo=types.ChatPhotoEmpty(),
+                      date=datetime.now(timezone.utc), access_hash=cid * 7, broadcast=True)
+        for cid in CHANNEL_IDS
+    ])
+    return client
+
+
+async def run(raw_prefilter: bool, updates: list) -> float:
+    """Dispatch all updates, wait until processed; CPU seconds spent."""
+    main.RAW_PREFILTER = raw_prefilter
+    main.TARGET_CHANNELS = [-(1000000000000 + cid) for cid in CHANNEL_IDS]
+    main.set_monitored(main.TARGET_CHANNELS)
+    for peer_id, cid in zip(main.TARGET_CHANNELS, CHANNEL_IDS):
+        main._chat_titles[peer_id] = f"Channel {cid}"
+
+    client = make_client()
+    main.setup_handlers(client)
+    main._scheduler = Scheduler(workers=main.WORKERS, max_queue=len(updates),
+                                cheap_queue=len(updates))
+    main._scheduler.start()
+
+    started = time.process_time()
+    for update in updates:
+        await client._dispatch_update(update)
+    await main._scheduler._queue.join()
+    await main._scheduler._cheap.join()
+    spent = time.process_time() - started
+
+    await main._scheduler.stop()
+    return spent
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="CPU per post: NewMessage events vs raw prefilter")
+    parser.add_argument("--count", type=int, default=20000, help="synthetic posts per run")
+    parser.add_argument("--buttons", type=float, default=0.05, help="share of posts with a keyboard")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode (best is reported)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    updates = make_updates(args.count, args.buttons)
+    with_buttons = sum(1 for u in updates if u.message.reply_markup)
+    print(f"{args.count} posts, {with_buttons} with a keyboard")
+
+    results = {}
+    for name, raw in (("NewMessage", False), ("raw prefilter", True)):
+        results[name] = min(asyncio.run(run(raw, updates)) for _ in range(args.repeat))
+        print(f"{name:<14} {results[name] * 1e6 / args.count:8.1f}us CPU/post")
+
+    ratio = results["NewMessage"] / results["raw prefilter"] if results["raw prefilter"] else 0
+    print(f"speedup: {ratio:.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
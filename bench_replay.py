@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay a captured corpus (CAPTURE_FILE) through process_message/smart_claim
+with a fake client and report decision latency: time from event to the
+claim RPC being issued. Run before deploying to catch regressions in
+classification or URL parsing.
+
+    python bench_replay.py corpus.jsonl --repeat 20
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import sys
+import time
+
+import main
+from corpus import read_corpus
+from dedup import DedupCache
+from fake_telegram import FakeClient, event_from_record
+from markup_diff import MarkupTracker
+
+# Fake client calls that count as the claim RPC being issued
+CLAIM_CALLS = ("rpc", "send_message")
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    idx = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[idx]
+
+
+def format_row(name: str, values_us: list) -> str:
+    values_us.sort()
+    if not values_us:
+        return f"{name:<18} {'n=0':>8}"
+    return (f"{name:<18} n={len(values_us):<7} "
+            f"p50={percentile(values_us, 50):8.1f}us  "
+            f"p99={percentile(values_us, 99):8.1f}us  "
+            f"p999={percentile(values_us, 99.9):8.1f}us  "
+            f"max={values_us[-1]:8.1f}us")
+
+
+async def replay(records: list, repeat: int):
+    client = FakeClient()
+    to_rpc = []      # event -> first RPC issued (claims only)
+    decision = []    # event -> process_message returned (all messages)
+
+    for _ in range(repeat):
+        # Every pass must claim again: forget what the last one sent
+        main.dedup = DedupCache(main.DEDUP_SIZE, main.DEDUP_TTL)
+        main.markup = MarkupTracker(main.EDIT_TRACK_SIZE)
+        for record in records:
+            event = event_from_record(record)
+            client.reset()
+            t0 = time.perf_counter()
+            await main.process_message(client, event)
+            t1 = time.perf_counter()
+            decision.append((t1 - t0) * 1e6)
+            sent = [ts for ts, kind, _ in client.calls if kind in CLAIM_CALLS]
+            if sent:
+                to_rpc.append((sent[0] - t0) * 1e6)
+        # Let fire-and-forget tasks (notifications) finish between rounds
+        await asyncio.sleep(0)
+
+    return to_rpc, decision
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay corpus and measure claim decision latency")
+    parser.add_argument("corpus", help="JSONL corpus written with CAPTURE_FILE")
+    parser.add_argument("--repeat", type=int, default=10, help="replay the corpus N times")
+    parser.add_argument("--verbose", action="store_true", help="keep claimer logging enabled")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    records = list(read_corpus(args.corpus))
+    if not records:
+        print(f"Corpus {args.corpus} is empty")
+        sys.exit(1)
+
+    to_rpc, decision = asyncio.run(replay(records, args.repeat))
+
+    with_buttons = sum(1 for r in records if r.get("rows"))
+    print("=" * 50)
+    print(f"Corpus: {args.corpus}")
+    print(f"Messages: {len(records)} | With buttons: {with_buttons} | Repeat: {args.repeat}")
+    print("=" * 50)
+    print(format_row("event -> RPC", to_rpc))
+    print(format_row("decision (all)", decision))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Monitored channel set for thousands of channels: entries come from the
+TARGET_CHANNELS env var and/or a channels file, and are kept as a frozen
+set of peer ids, so the per-update check is one hash lookup. Changes
+build a new set and swap it in; handlers never need to be re-registered.
+"""
+
+import sys
+from typing import Iterable, Optional, Union
+
+from telethon import utils
+from telethon.tl import types
+
+ChannelEntry = Union[int, str]
+
+
+def parse_channel_list(text: str) -> list[ChannelEntry]:
+    """Comma- or newline-separated entries; '#' starts a comment.
+    Numeric entries become ints (peer ids), the rest stay usernames/links."""
+    entries = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        for item in line.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                entry: ChannelEntry = int(item)
+            except ValueError:
+                entry = item
+            if entry not in seen:
+                seen.add(entry)
+                entries.append(entry)
+    return entries
+
+
+def read_channels_file(path: str) -> list[ChannelEntry]:
+    with open(path, encoding="utf-8") as f:
+        return parse_channel_list(f.read())
+
+
+class ChannelSet:
+    """Frozen set of marked peer ids plus bare channel id -> peer id (what
+    raw updates carry) and the same for basic groups. Never mutated: a
+    changed list builds a new ChannelSet (see set_monitored)."""
+
+    __slots__ = ("ids", "bare", "chats")
+
+    def __init__(self, peer_ids: Iterable[int] = ()):
+        self.ids = frozenset(peer_ids)
+        self.bare: dict[int, int] = {}
+        self.chats: dict[int, int] = {}
+        for peer_id in self.ids:
+            bare_id, peer_type = utils.resolve_id(peer_id)
+            if peer_type is types.PeerChannel:
+                self.bare[bare_id] = peer_id
+            elif peer_type is types.PeerChat:
+                self.chats[bare_id] = peer_id
+
+    def __contains__(self, peer_id: Optional[int]) -> bool:
+        return peer_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def diff(self, other: "ChannelSet") -> tuple[int, int]:
+        """(added, removed) going from self to other."""
+        return len(other.ids - self.ids), len(self.ids - other.ids)
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: both containers plus the int objects."""
+        ints = (sum(sys.getsizeof(i) for i in self.ids) + sum(sys.getsizeof(i) for i in self.bare)
+                + sum(sys.getsizeof(i) for i in self.chats))
+        return sys.getsizeof(self.ids) + sys.getsizeof(self.bare) + sys.getsizeof(self.chats) + ints
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Dedicated MTProto connection for claim RPCs. A second TelegramClient on
+the same authorization, connected to the account's home DC with updates
+disabled, so /start messages and button presses get their own socket and
+send queue instead of waiting behind notifications, preload or entity
+lookups on the main client. Kept warm with periodic pings.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Optional
+
+from telethon import TelegramClient
+from telethon.sessions import MemorySession
+from telethon.tl.functions import PingRequest
+
+logger = logging.getLogger(__name__)
+
+LINK_DEDICATED = "dedicated"
+LINK_SHARED = "shared"
+
+
+class ClaimLink:
+    """Owns the claim connection; pick() falls back to the main client
+    while it is not connected.
+
+    on_ping(rtt_us) is called after every keepalive ping.
+    """
+
+    def __init__(self, api_id: int, api_hash: str, *, keepalive: float = 20.0,
+                 on_ping: Optional[Callable[[int], None]] = None):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.keepalive = keepalive
+        self.on_ping = on_ping or (lambda rtt_us: None)
+        self.client: Optional[TelegramClient] = None
+        self.dc_id: Optional[int] = None
+        self.last_rtt: Optional[float] = None
+        self.connects = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.client is not None and self.client.is_connected()
+
+    def pick(self, fallback: TelegramClient) -> tuple[TelegramClient, str]:
+        """(client, link label) to send a claim through."""
+        if self.ready:
+            return self.client, LINK_DEDICATED
+        return fallback, LINK_SHARED
+
+    async def start(self, main: TelegramClient):
+        """Connect with the main client's DC and auth key (after login)."""
+        source = main.session
+        if source.auth_key is None:
+            raise RuntimeError("main client is not authorized")
+        session = MemorySession()
+        session.set_dc(source.dc_id, source.server_address, source.port)
+        session.auth_key = source.auth_key
+        self.dc_id = source.dc_id
+        self.client = TelegramClient(session, self.api_id, self.api_hash, receive_updates=False)
+        # The loop reconnects, so a failed first connect is retried too
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        await self._connect()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.client and self.client.is_connected():
+            await self.client.disconnect()
+
+    async def ping(self) -> float:
+        """Round trip in seconds; also keeps NAT and the server session warm."""
+        started = time.perf_counter()
+        await self.client(PingRequest(ping_id=random.randrange(-2**63, 2**63)))
+        self.last_rtt = time.perf_counter() - started
+        self.on_ping(int(self.last_rtt * 1e6))
+        return self.last_rtt
+
+    async def _connect(self):
+        await self.client.connect()
+        self.connects += 1
+        rtt = await self.ping()
+        logger.info(f"🔌 Канал клеймов подключен к DC{self.dc_id} (ping {rtt * 1000:.0f}ms)")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.keepalive)
+            try:
+                if self.client.is_connected():
+                    await asyncio.wait_for(self.ping(), self.keepalive)
+                else:
+                    await self._connect()
+            except Exception as e:
+                # Claims use the main client until the next attempt succeeds
+                self.failures += 1
+                logger.warning(f"⚠️ Канал клеймов: {e or type(e).__name__}")
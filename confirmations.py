@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Claim confirmation tracking: a sent /start only means the RPC went
+through, so outstanding claims are indexed by bot and matched to the
+bot's reply within a time window. The reply text gives the outcome (won,
+already claimed, expired); callback presses are classified from the
+callback answer right away. Results live in counters and a bounded
+history, and nothing here is awaited on the claim path.
+"""
+
+import asyncio
+from collections import Counter, deque
+from typing import Callable, NamedTuple, Optional
+
+from matcher import AhoCorasick
+
+OUTCOME_WON = "won"
+OUTCOME_ALREADY = "already_claimed"
+OUTCOME_EXPIRED = "expired"
+OUTCOME_UNKNOWN = "unknown"      # bot replied, text not recognized
+OUTCOME_NO_REPLY = "no_reply"    # nothing within the window
+
+# Reply phrases per outcome, lowercase. Checked together in one pass;
+# the earlier outcome wins ("уже получили" is not a win)
+REPLY_PHRASES = {
+    OUTCOME_ALREADY: [
+        "уже активирован", "уже получ", "уже использ", "уже забра", "уже участв",
+        "already activated", "already claimed", "already used", "already received",
+        "already participat",
+    ],
+    OUTCOME_EXPIRED: [
+        "истек", "истёк", "не найден", "закончил", "недействител", "больше не",
+        "нет активаций", "активации закончились",
+        "expired", "not found", "no longer", "invalid", "ran out", "no activations",
+    ],
+    OUTCOME_WON: [
+        "вы получили", "получено", "зачислен", "вы активировали", "активирован чек",
+        "вы выиграли", "вы участвуете", "успешно",
+        "you received", "you have received", "you got", "you activated", "credited",
+        "you won", "you are participating", "successfully",
+    ],
+}
+_OUTCOME_ORDER = {outcome: i for i, outcome in enumerate(REPLY_PHRASES)}
+_phrases = AhoCorasick(
+    (phrase, outcome) for outcome, phrases in REPLY_PHRASES.items() for phrase in phrases)
+
+
+def classify_reply(text: Optional[str]) -> Optional[str]:
+    """Outcome for a bot reply or callback answer, None if unrecognized."""
+    if not text:
+        return None
+    hits = _phrases.findall(text.lower())
+    if not hits:
+        return None
+    return min(hits, key=_OUTCOME_ORDER.__getitem__)
+
+
+class ClaimResult(NamedTuple):
+    claim_type: str
+    bot: str
+    code: str
+    outcome: str
+    seconds: Optional[float]   # send -> confirmation, None without a reply
+
+
+class _Pending:
+    __slots__ = ("bot", "code", "claim_type", "sent", "replied")
+
+    def __init__(self, bot: str, code: str, claim_type: str, sent: float):
+        self.bot = bot
+        self.code = code
+        self.claim_type = claim_type
+        self.sent = sent
+        self.replied = False   # got a reply we could not classify
+
+
+class ConfirmationTracker:
+    """Outstanding /start claims per bot (FIFO within a bot), expired after
+    window seconds. Bots are keyed by user id when known, else username.
+
+    on_result(result) is called for every finished claim.
+    """
+
+    def __init__(self, window: float = 30.0, history: int = 200,
+                 on_result: Optional[Callable[[ClaimResult], None]] = None):
+        self.window = window
+        self.on_result = on_result or (lambda result: None)
+        self.counts: Counter = Counter()      # (claim_type, outcome) -> n
+        self.recent: deque = deque(maxlen=history)
+        self._pending: dict[object, deque] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._pending.values())
+
+    def expect(self, bot_key, bot: str, code: str, claim_type: str, sent: float):
+        """Register a sent claim; O(1), never waits."""
+        queue = self._pending.get(bot_key)
+        if queue is None:
+            queue = self._pending[bot_key] = deque()
+        queue.append(_Pending(bot, code, claim_type, sent))
+
+    def wants(self, chat_id: int) -> bool:
+        """Cheap filter for incoming private messages."""
+        return bool(self._pending) and (chat_id in self._pending or any(
+            isinstance(key, str) for key in self._pending))
+
+    def on_reply(self, chat_id: int, username: Optional[str], text: str,
+                 now: float) -> Optional[ClaimResult]:
+        """Match a bot message to its oldest outstanding claim."""
+        key = chat_id if chat_id in self._pending else (username or "").lower()
+        queue = self._pending.get(key)
+        if not queue:
+            return None
+        self._expire(key, queue, now)
+        if not queue:
+            return None
+        outcome = classify_reply(text)
+        if outcome is None:
+            queue[0].replied = True  # Maybe a greeting; wait for the next one
+            return None
+        pending = queue.popleft()
+        if not queue:
+            del self._pending[key]
+        return self._finish(pending, outcome, now - pending.sent)
+
+    def resolve(self, claim_type: str, bot: str, code: str, text: Optional[str],
+                seconds: float) -> ClaimResult:
+        """Outcome known at once (callback answer)."""
+        outcome = classify_reply(text) or OUTCOME_UNKNOWN
+        return self._finish(_Pending(bot, code, claim_type, 0.0), outcome, seconds)
+
+    def sweep(self, now: float):
+        """Finish claims whose window has passed."""
+        for key in list(self._pending):
+            queue = self._pending[key]
+            self._expire(key, queue, now)
+
+    def _expire(self, key, queue: deque, now: float):
+        while queue and now - queue[0].sent > self.window:
+            pending = queue.popleft()
+            self._finish(pending, OUTCOME_UNKNOWN if pending.replied else OUTCOME_NO_REPLY, None)
+        if not queue:
+            self._pending.pop(key, None)
+
+    def _finish(self, pending: _Pending, outcome: str, seconds: Optional[float]) -> ClaimResult:
+        result = ClaimResult(pending.claim_type, pending.bot, pending.code, outcome, seconds)
+        self.counts[(pending.claim_type, outcome)] += 1
+        self.recent.append(result)
+        self.on_result(result)
+        return result
+
+    def outcomes(self) -> Counter:
+        """Outcome -> n over all claim types."""
+        total: Counter = Counter()
+        for (_, outcome), count in self.counts.items():
+            total[outcome] += count
+        return total
+
+    def start(self, clock: Callable[[], float]):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(clock))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, clock: Callable[[], float]):
+        while True:
+            await asyncio.sleep(max(1.0, self.window / 4))
+            self.sweep(clock())
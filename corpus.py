@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Record/replay corpus of incoming messages.
+One JSON object per line with only what the claim logic looks at:
+chat id, message id and the button rows (text, url, callback data).
+"""
+
+import base64
+import json
+import logging
+import time
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def message_to_record(chat_id: int, message) -> dict:
+    """Convert a Telethon message into a compact corpus record."""
+    record = {"ts": round(time.time(), 3), "chat": chat_id, "msg": message.id}
+    if message.buttons:
+        rows = []
+        for row in message.buttons:
+            buttons = []
+            for btn in row:
+                item = {}
+                if btn.text:
+                    item["text"] = btn.text
+                if btn.url:
+                    item["url"] = btn.url
+                if btn.data:
+                    item["data"] = base64.b64encode(btn.data).decode("ascii")
+                buttons.append(item)
+            rows.append(buttons)
+        record["rows"] = rows
+    return record
+
+
+def decode_data(item: dict) -> Optional[bytes]:
+    """Return callback data of a recorded button."""
+    data = item.get("data")
+    return base64.b64decode(data) if data else None
+
+
+class CorpusWriter:
+    """Append-only JSONL writer for captured messages."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, chat_id: int, message):
+        try:
+            record = message_to_record(chat_id, message)
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            self._file.write("\n")
+            self.count += 1
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать сообщение в корпус: {e}")
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_corpus(path: str) -> Iterator[dict]:
+    """Yield records from a corpus file, skipping broken lines."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded LRU+TTL set of already claimed targets, so a check reposted to
+several channels (or seen again after a restart) costs one RPC, not many.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DedupCache:
+    """LRU set with per-entry expiry (wall clock, so it can be persisted)."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def seen(self, key: tuple, now: Optional[float] = None) -> bool:
+        """Return True if key was seen within TTL; otherwise remember it."""
+        now = now or time.time()
+        expires = self._entries.get(key)
+        if expires is not None and expires > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        self._entries[key] = now + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return False
+
+    def forget(self, key: tuple):
+        """Drop key, e.g. when the claim it stood for was never delivered."""
+        self._entries.pop(key, None)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def save(self, path: str):
+        """Write live entries to path (atomically)."""
+        now = time.time()
+        live = [[list(key), expires] for key, expires in self._entries.items() if expires > now]
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(live, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить кэш дубликатов: {e}")
+
+    def load(self, path: str) -> int:
+        """Load entries saved with save(); expired ones are skipped."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Кэш дубликатов {path} не прочитан: {e}")
+            return 0
+        now = time.time()
+        for key, expires in data:
+            if expires > now:
+                self._entries[tuple(key)] = expires
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return len(self._entries)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Button URL -> (bot, app, start_param, kind). Handles t.me / telegram.me /
+telegram.dog links with or without scheme, Mini App links
+(t.me/bot/app?startapp=) and tg://resolve. Results are memoized per URL,
+since the same check links are reposted across channels.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from urllib.parse import unquote
+
+KIND_START = "start"        # ?start=<param>
+KIND_STARTAPP = "startapp"  # ?startapp=<param> (Mini App)
+KIND_LINK = "link"          # Telegram link without a start parameter
+
+PARSE_CACHE_SIZE = 4096
+
+_TME_RE = re.compile(
+    r"^(?:https?://)?(?:www\.)?(?:t|telegram)\.(?:me|dog)/"
+    r"([^/?#]*)(?:/([^/?#]*))?[^?#]*(?:\?([^#]*))?",
+    re.IGNORECASE,
+)
+_TG_RE = re.compile(r"^tg://resolve\?([^#]*)", re.IGNORECASE)
+_QUERY_RE = re.compile(r"\?([^#]*)")
+_USERNAME_RE = re.compile(r"^[A-Za-z]\w{2,31}$")
+
+# First path segments of t.me links that are not usernames
+_RESERVED = frozenset({
+    "joinchat", "addstickers", "addemoji", "addlist", "addtheme", "share",
+    "proxy", "socks", "setlanguage", "iv", "c", "s", "boost", "invoice",
+    "login", "confirmphone", "bg", "m", "contact", "giftcode", "nft",
+})
+
+
+class DeepLink(NamedTuple):
+    bot: Optional[str]           # lowercase username, None if unknown
+    app: Optional[str]           # Mini App short name
+    start_param: Optional[str]   # as in the URL (codes are case-sensitive)
+    kind: str
+
+
+def _query_params(query: Optional[str]) -> dict:
+    params = {}
+    if query:
+        for part in query.split("&"):
+            key, _, value = part.partition("=")
+            key = key.lower()
+            if key and key not in params:
+                params[key] = unquote(value) if "%" in value else value
+    return params
+
+
+def _username(segment: Optional[str]) -> Optional[str]:
+    if not segment or segment.lower() in _RESERVED or not _USERNAME_RE.match(segment):
+        return None
+    return segment.lower()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_link(url: str) -> Optional[DeepLink]:
+    """Parse a button URL. None for non-Telegram URLs without a start
+    parameter; other sites with ?start= give a DeepLink with bot=None."""
+    if not url:
+        return None
+    url = url.strip()
+
+    match = _TME_RE.match(url)
+    if match:
+        segment, app, query = match.groups()
+        bot = _username(segment)
+        # t.me/<channel>/<post id> is a post link, not a Mini App
+        app = app if bot and app and not app.isdigit() else None
+    else:
+        match = _TG_RE.match(url)
+        if match:
+            params = _query_params(match.group(1))
+            bot = _username(params.get("domain"))
+            app = params.get("appname") or None
+            return _from_params(bot, app, params)
+        match = _QUERY_RE.search(url)
+        query = match.group(1) if match else None
+        bot = app = None
+    return _from_params(bot, app, _query_params(query))
+
+
+def _from_params(bot: Optional[str], app: Optional[str], params: dict) -> Optional[DeepLink]:
+    if params.get("start"):
+        return DeepLink(bot, app, params["start"], KIND_START)
+    if params.get("startapp"):
+        return DeepLink(bot, app, params["startapp"], KIND_STARTAPP)
+    if bot:
+        return DeepLink(bot, app, None, KIND_LINK)
+    return None
+
+
+def cache_stats() -> tuple[int, int]:
+    """(hits, misses) of the parse cache."""
+    info = parse_link.cache_info()
+    return info.hits, info.misses
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+In-process stand-ins for the Telethon objects the claimer touches.
+Used by the benchmarks to drive process_message/smart_claim offline, and
+by bench_load.py to push setup_handlers through a flood: FakeClient can
+add RPC latency, random errors and FloodWaitError, and dispatches events
+to handlers registered with client.on().
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+from telethon import events
+from telethon.errors import FloodWaitError, RPCError
+
+from corpus import decode_data
+
+
+class FakeButton:
+    """Mirrors telethon.tl.custom.MessageButton (text/url/data)."""
+
+    __slots__ = ("text", "url", "data")
+
+    def __init__(self, text: str = "", url: Optional[str] = None, data: Optional[bytes] = None):
+        self.text = text
+        self.url = url
+        self.data = data
+
+
+class FakeMessage:
+    __slots__ = ("id", "text", "media", "buttons", "entities")
+
+    def __init__(self, msg_id: int, text: str = "", buttons=None, media=None, entities=None):
+        self.id = msg_id
+        self.text = text
+        self.media = media
+        self.buttons = buttons
+        self.entities = entities
+
+    @property
+    def raw_text(self) -> str:
+        return self.text
+
+
+class FakeChat:
+    __slots__ = ("id", "title")
+
+    def __init__(self, chat_id: int, title: str):
+        self.id = chat_id
+        self.title = title
+
+
+class FakeEvent:
+    """Mirrors events.NewMessage.Event as far as the claimer uses it.
+
+    With a client, get_chat() goes through client.get_entity() like an
+    uncached Telethon event does.
+    """
+
+    __slots__ = ("chat_id", "message", "_chat", "_client")
+
+    def __init__(self, chat_id: int, message: FakeMessage, client: Optional["FakeClient"] = None):
+        self.chat_id = chat_id
+        self.message = message
+        self._chat = FakeChat(chat_id, f"Channel {chat_id}")
+        self._client = client
+
+    async def get_chat(self):
+        if self._client is not None:
+            return await self._client.get_entity(self.chat_id)
+        return self._chat
+
+
+def event_from_record(record: dict) -> FakeEvent:
+    """Build a fake event from a corpus record."""
+    buttons = None
+    if record.get("rows"):
+        buttons = [
+            [FakeButton(item.get("text", ""), item.get("url"), decode_data(item)) for item in row]
+            for row in record["rows"]
+        ]
+    message = FakeMessage(record.get("msg", 0), buttons=buttons)
+    return FakeEvent(record.get("chat", 0), message)
+
+
+class FakeClient:
+    """Records every RPC the claimer issues, with a perf_counter timestamp.
+
+    latency/jitter (seconds) delay every call; error_rate and flood_rate
+    are the shares of calls failing with RPCError / FloodWaitError.
+    record=False keeps only the per-kind counters (long load runs).
+    """
+
+    def __init__(self, *, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, flood_rate: float = 0.0, flood_seconds: int = 5,
+                 record: bool = True, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.record = record
+        self.calls: list[tuple[float, str, object]] = []
+        self.counts: Counter = Counter()
+        self.errors = 0
+        self.floods = 0
+        self.handlers: list[tuple[object, object]] = []
+        self._rng = random.Random(seed)
+
+    def _record(self, kind: str, payload):
+        self.counts[kind] += 1
+        if self.record:
+            self.calls.append((time.perf_counter(), kind, payload))
+
+    async def _rpc(self, kind: str, payload):
+        """Record the call, then wait and fail as configured."""
+        self._record(kind, payload)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._rng.random() * self.jitter)
+        roll = self._rng.random()
+        if roll < self.flood_rate:
+            self.floods += 1
+            raise FloodWaitError(payload, capture=self.flood_seconds)
+        if roll < self.flood_rate + self.error_rate:
+            self.errors += 1
+            raise RPCError(payload, "INTERNAL_SERVER_ERROR", 500)
+
+    async def __call__(self, request):
+        await self._rpc("rpc", request)
+
+    async def send_message(self, entity, message, **kwargs):
+        await self._rpc("send_message", (entity, message))
+
+    async def get_entity(self, entity):
+        await self._rpc("get_entity", entity)
+        if isinstance(entity, list):
+            return [FakeChat(e, f"Channel {e}") if isinstance(e, int) else e for e in entity]
+        return FakeChat(entity, f"Channel {entity}") if isinstance(entity, int) else entity
+
+    async def get_input_entity(self, entity):
+        self._record("get_input_entity", entity)
+        return entity
+
+    def is_connected(self) -> bool:
+        return True
+
+    def on(self, event_builder):
+        """Decorator like TelegramClient.on()."""
+        def decorator(callback):
+            self.handlers.append((event_builder, callback))
+            return callback
+        return decorator
+
+    async def dispatch(self, event, edited: bool = False):
+        """Run the handlers matching a new (or edited) message event, the way
+        Telethon's dispatcher does after building the event. Raw handlers
+        are not fed: use RAW_PREFILTER=0 with this client."""
+        kind = events.MessageEdited if edited else events.NewMessage
+        for builder, callback in self.handlers:
+            if type(builder) is not kind:
+                continue
+            if builder.func is not None and not builder.func(event):
+                continue
+            await callback(event)
+
+    def reset(self):
+        self.calls.clear()
+        self.counts.clear()
+        self.errors = 0
+        self.floods = 0
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Check links outside the keyboard: hidden links (MessageEntityTextUrl) and
+t.me / tg:// links in the post text. Both become button-like TextLink
+objects, so plan_buttons classifies them exactly like URL buttons. The
+text is scanned by one compiled regex, and only after a check that looks
+at nothing but the slashes in it; has_links() is that check, used by the
+update path to decide whether a button-less post needs a closer look.
+"""
+
+import re
+from typing import Iterable, Optional
+
+from telethon.helpers import add_surrogate, del_surrogate
+from telethon.tl.types import MessageEntityTextUrl
+
+from deeplink import parse_link
+
+# What comes right before the first "/" of a Telegram link
+_LINK_HEADS = ("t.me", "telegram.me", "telegram.dog", "tg:")
+_HEAD_LAST = frozenset("eEgG:")
+_LINK_RE = re.compile(
+    r"(?<![\w.-])(?:https?://)?(?:www\.)?(?:t|telegram)\.(?:me|dog)/[^\s<>\"'«»]+"
+    r"|tg://resolve\?[^\s<>\"'«»]+",
+    re.IGNORECASE,
+)
+# Punctuation that ends a sentence rather than the link
+_TRAILING = ".,;:!?)]}"
+
+
+class TextLink:
+    """Quacks like telethon.tl.custom.MessageButton for plan_buttons."""
+
+    __slots__ = ("text", "url", "data")
+
+    def __init__(self, text: str, url: str):
+        self.text = text
+        self.url = url
+        self.data = None
+
+    def __repr__(self):
+        return f"TextLink({self.text!r}, {self.url!r})"
+
+
+def _has_link_text(text: str) -> bool:
+    """Look only at what precedes each "/": past the C-level split, cost
+    follows the number of slashes, not the length of the text."""
+    if "/" not in text:
+        return False
+    for piece in text.split("/")[:-1]:
+        if piece and piece[-1] in _HEAD_LAST and piece[-12:].lower().endswith(_LINK_HEADS):
+            return True
+    return False
+
+
+def has_links(text: Optional[str], entities) -> bool:
+    """Cheap test: does the post carry a link worth scanning?"""
+    if entities:
+        for entity in entities:
+            if type(entity) is MessageEntityTextUrl:
+                return True
+    return bool(text) and _has_link_text(text)
+
+
+def _claim_key(url: str):
+    """Same bot and code means the same claim, whatever the URL form."""
+    link = parse_link(url)
+    if link is None or not link.start_param:
+        return None
+    return link.bot, link.start_param
+
+
+def extract_links(text: Optional[str], entities, rows: Optional[Iterable] = None) -> list[TextLink]:
+    """Links with a start parameter from entities and text, without repeats
+    and without links the keyboard (rows) already has."""
+    if not text and not entities:
+        return []
+    seen = set()
+    if rows:
+        for row in rows:
+            for btn in row:
+                if btn.url:
+                    seen.add(_claim_key(btn.url))
+
+    links = []
+    surrogated = None
+    for entity in entities or ():
+        if type(entity) is not MessageEntityTextUrl:
+            continue
+        key = _claim_key(entity.url)
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+        if surrogated is None:
+            surrogated = add_surrogate(text or "")
+        anchor = del_surrogate(surrogated[entity.offset:entity.offset + entity.length])
+        links.append(TextLink(anchor, entity.url))
+
+    if text and _has_link_text(text):
+        for match in _LINK_RE.finditer(text):
+            url = match.group(0).rstrip(_TRAILING)
+            key = _claim_key(url)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            links.append(TextLink("", url))
+    return links
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Non-blocking logging: records are put on a bounded queue by the event loop
+and written to stdout (and optionally a rotating JSON file) by a listener
+thread, so slow stdout on Railway never stalls a claim.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s | %(levelname)-7s | %(message)s"
+LOG_DATEFMT = "%H:%M:%S"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for the structured file sink."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def setup_logging(level: str = "INFO", json_file: str = "", json_max_mb: int = 10,
+                  json_backups: int = 3, queue_size: int = 10000):
+    """Route root logging through a queue. Returns (queue handler, listener)."""
+    handlers = []
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATEFMT))
+    handlers.append(stream)
+
+    if json_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            json_file, maxBytes=json_max_mb * 1024 * 1024,
+            backupCount=json_backups, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    listener.start()
+    return queue_handler, listener
+
+
+def stop_logging(listener: Optional[logging.handlers.QueueListener]):
+    """Flush queued records and stop the listener thread."""
+    if listener and listener._thread is not None:
+        listener.stop()
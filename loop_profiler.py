@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Sampling profiler for the asyncio loop, driven by an interval timer
+signal so nothing is installed while it is off. Each tick records:
+
+- the loop's real call stack (what burns CPU on the loop; time waiting
+  in the selector shows up as "(idle)");
+- every few ticks, the await chain of each pending task (where coroutines
+  such as process_message -> smart_claim -> send_claim are suspended);
+- and a probe task records how late short sleeps wake up (loop lag).
+
+Stacks are written in collapsed format ("a;b;c count"), which
+flamegraph.pl, speedscope and inferno render as flamegraphs; the lag
+timeline is a CSV.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Task await chains are walked every N ticks (all_tasks() is not free)
+AWAIT_SAMPLE_EVERY = 4
+IDLE = "(idle)"
+# Frames from here (asyncio, selectors, threading) are left out of top()
+STDLIB_DIR = os.path.dirname(os.__file__)
+
+
+def frame_label(code) -> str:
+    # co_qualname is 3.11+
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def thread_stack(frame) -> list[str]:
+    """Root-first labels of a thread's frame stack; selector wait is idle."""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "select" and code.co_filename.endswith("selectors.py"):
+            return [IDLE]
+        labels.append(frame_label(code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def await_stack(task: asyncio.Task) -> list[str]:
+    """Outermost-first coroutines of a task down to what it is awaiting."""
+    labels = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            if isinstance(coro, asyncio.Future):
+                labels.append(f"<{type(coro).__name__}>")
+            break
+        labels.append(frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+class LoopProfiler:
+    """Start/stop sampling of the loop running in the main thread; stop()
+    writes the files. Samples come from a SIGALRM interval timer, so they
+    land exactly where the loop is, busy or waiting in select()."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, out_dir: str = "profiles",
+                 interval: float = 0.005):
+        self.loop = loop
+        self.out_dir = out_dir
+        self.interval = interval
+        self.cpu: Counter = Counter()
+        self.awaits: Counter = Counter()
+        self.busy = 0                 # samples where the loop was not idle
+        self.inclusive: Counter = Counter()  # non-stdlib function -> busy samples
+        self.lag: list[tuple[float, float]] = []  # (seconds since start, lag seconds)
+        self.samples = 0
+        self.overhead = 0.0  # seconds spent in the sampling handler
+        self.started_at: Optional[float] = None
+        self._previous_handler = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lag_task is not None
+
+    def start(self):
+        """Call from the loop, in the main thread."""
+        if self.running:
+            return
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("нужны signal.setitimer и loop в главном потоке")
+        self.cpu.clear()
+        self.awaits.clear()
+        self.busy = 0
+        self.inclusive.clear()
+        self.lag.clear()
+        self.samples = 0
+        self.overhead = 0.0
+        self.started_at = time.perf_counter()
+        self._previous_handler = signal.signal(signal.SIGALRM, self._on_tick)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        self._lag_task = asyncio.create_task(self._lag_probe())
+
+    def stop(self) -> list[str]:
+        """Stop sampling and write the profile. Returns the written paths."""
+        if not self.running:
+            return []
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._previous_handler or signal.SIG_DFL)
+        self._lag_task.cancel()
+        self._lag_task = None
+        return self.write()
+
+    def _on_tick(self, signum, frame):
+        started = time.perf_counter()
+        if frame is not None:
+            self._sample_loop(frame)
+        if self.samples % AWAIT_SAMPLE_EVERY == 0:
+            self._sample_tasks()
+        self.samples += 1
+        self.overhead += time.perf_counter() - started
+
+    def _sample_loop(self, frame):
+        stack = thread_stack(frame)
+        self.cpu[";".join(stack)] += 1
+        if stack[0] == IDLE:
+            return
+        self.busy += 1
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            if code not in seen and not code.co_filename.startswith(STDLIB_DIR) and code.co_name != "<module>":
+                seen.add(code)
+                self.inclusive[frame_label(code)] += 1
+            frame = frame.f_back
+
+    def _sample_tasks(self):
+        for task in asyncio.all_tasks(self.loop):
+            stack = await_stack(task)
+            if stack:
+                self.awaits[";".join(stack)] += 1
+
+    async def _lag_probe(self):
+        """Timeline of how late a short sleep wakes up."""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag.append((started - self.started_at, max(0.0, now - started - self.interval)))
+
+    def top(self, limit: int = 5) -> list[tuple[str, float]]:
+        """Non-stdlib functions with the largest inclusive share of busy loop samples."""
+        if not self.busy:
+            return []
+        return [(label, count / self.busy) for label, count in self.inclusive.most_common(limit)]
+
+    def write(self) -> list[str]:
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}")
+        paths = []
+        for suffix, stacks in ((".cpu.collapsed", self.cpu), (".await.collapsed", self.awaits)):
+            with open(base + suffix, "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            paths.append(base + suffix)
+        with open(base + ".lag.csv", "w", encoding="utf-8") as f:
+            f.write("t_ms,lag_ms\n")
+            for at, lag in self.lag:
+                f.write(f"{at * 1000:.1f},{lag * 1000:.3f}\n")
+        paths.append(base + ".lag.csv")
+        return paths
@@ -7,20 +7,46 @@ Features: Предзагрузка ботов, параллельная обра
 """
 
 import asyncio
+import atexit
+import json
 import logging
 import os
+import random
+import signal
 import sys
 import time
 import traceback
+from collections import Counter
 from datetime import datetime
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from dotenv import load_dotenv
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
 from telethon.sessions import StringSession
+from telethon.tl import types
 from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+from telethon.tl.functions.updates import GetStateRequest
 from telethon.errors import SessionPasswordNeededError, FloodWaitError
 
+from channels import ChannelSet, parse_channel_list, read_channels_file
+from claim_link import LINK_DEDICATED, LINK_SHARED, ClaimLink
+from confirmations import OUTCOME_WON, ClaimResult, ConfirmationTracker
+from corpus import CorpusWriter
+from dedup import DedupCache
+from deeplink import cache_stats as deeplink_cache_stats, parse_link
+from links import TextLink, extract_links, has_links
+from log_pipeline import setup_logging, stop_logging
+from loop_profiler import LoopProfiler
+from markup_diff import MarkupTracker
+from metrics import Metrics, MetricsServer, escape_label
+from notifier import Notifier
+from stall_watchdog import ActivityModel, Watchdog
+from session_store import SessionFlusher, SnapshotSession, open_session
+from scheduler import PRIORITY_BUTTONS, PRIORITY_CLAIM, Scheduler
+from rules import (CODE_KIND_LISTS, URL_KIND_LISTS, RuleHits, RuleSet,
+                   RuleWatcher, build_rules, load_rules)
+from matcher import ButtonVerdict, CodeVerdict, UrlVerdict
+
 # Load environment variables
 load_dotenv()
 
@@ -31,38 +57,138 @@ API_ID = os.getenv("API_ID")
 API_HASH = os.getenv("API_HASH")
 SESSION_NAME = os.getenv("SESSION_NAME", "gift_claimer_session")
 STRING_SESSION = os.getenv("STRING_SESSION", "")
-DEFAULT_GIFT_BOT = os.getenv("DEFAULT_GIFT_BOT", "anonimgifterbot")
+# "memory": session lives in memory and is snapshotted to SESSION_SNAPSHOT
+# from a background thread (migrates SESSION_NAME.session / STRING_SESSION
+# on first start). "file": Telethon's SQLite file or StringSession as is.
+# The snapshot holds the auth key, so with STRING_SESSION (which otherwise
+# never touches the disk) memory is opt-in
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "file" if STRING_SESSION else "memory").lower()
+SESSION_SNAPSHOT = os.getenv("SESSION_SNAPSHOT", f"{SESSION_NAME}.session.json")
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "60"))
+DEFAULT_GIFT_BOT = os.getenv("DEFAULT_GIFT_BOT", "anonimgifterbot").lower()  # _peers keys are lowercase
 NOTIFY_USER = os.getenv("NOTIFY_USER", "me")  # "me" = Saved Messages
 
 # Parse target channels from env
-channels_str = os.getenv("TARGET_CHANNELS", "")
-TARGET_CHANNELS = []
-if channels_str:
-    for ch in channels_str.split(","):
-        ch = ch.strip()
-        if ch:
-            try:
-                TARGET_CHANNELS.append(int(ch))
-            except ValueError:
-                TARGET_CHANNELS.append(ch)
+TARGET_CHANNELS = parse_channel_list(os.getenv("TARGET_CHANNELS", ""))
+# Optional file with more channels (one per line or comma-separated,
+# '#' comments), re-read when it changes
+CHANNELS_FILE = os.getenv("CHANNELS_FILE", "")
+CHANNELS_POLL_INTERVAL = float(os.getenv("CHANNELS_POLL_INTERVAL", "30"))
+
+# Notifications are coalesced into digests: wait NOTIFY_WINDOW seconds for
+# more events, hold while a claim is in flight (up to NOTIFY_MAX_DEFER)
+NOTIFY_WINDOW = float(os.getenv("NOTIFY_WINDOW", "2"))
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "100"))
+NOTIFY_MAX_DEFER = float(os.getenv("NOTIFY_MAX_DEFER", "10"))
+
+# Duplicate protection: the same /start code or callback button is sent
+# only once within DEDUP_TTL seconds (optionally kept in DEDUP_FILE)
+DEDUP_SIZE = int(os.getenv("DEDUP_SIZE", "10000"))
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "3600"))
+DEDUP_FILE = os.getenv("DEDUP_FILE", "")
+
+# Edited posts: remember button fingerprints of this many recent messages
+EDIT_TRACK_SIZE = int(os.getenv("EDIT_TRACK_SIZE", "5000"))
+
+# Filter rules file (.toml/.json); overrides the built-in lists below and
+# is reloaded on SIGHUP or when the file changes, without reconnecting
+RULES_FILE = os.getenv("RULES_FILE", "")
+RULES_POLL_INTERVAL = float(os.getenv("RULES_POLL_INTERVAL", "5"))
 
 # Bots to preload (warm up connection)
 PRELOAD_BOTS_STR = os.getenv("PRELOAD_BOTS", "wallet,CryptoBot,send,tonRocketBot,xJetSwapBot")
 PRELOAD_BOTS = [b.strip() for b in PRELOAD_BOTS_STR.split(",") if b.strip()]
+# The default bot is claimed against without a URL, so always preload it
+if DEFAULT_GIFT_BOT and DEFAULT_GIFT_BOT.lower() not in {b.lower() for b in PRELOAD_BOTS}:
+    PRELOAD_BOTS.append(DEFAULT_GIFT_BOT)
+
+# How many bots/channels to resolve at once during preload
+PRELOAD_CONCURRENCY = int(os.getenv("PRELOAD_CONCURRENCY", "4"))
+
+# Resolved bots/channels (id + access_hash) are saved here and loaded on
+# boot, so a restart can claim right after connect()
+ENTITY_SNAPSHOT = os.getenv("ENTITY_SNAPSHOT", "entity_snapshot.json")
+
+# Posts fetched per channel after a reconnect to catch up on what was
+# missed while offline (0 = disabled)
+CATCHUP_LIMIT = int(os.getenv("CATCHUP_LIMIT", "50"))
+
+# Update processing: fixed worker pool fed by a bounded priority queue.
+# Handlers run sequentially (sequential_updates), so while the queue is
+# full Telethon reads no further updates; button-less posts are dropped
+WORKERS = int(os.getenv("WORKERS", "8"))
+WORK_QUEUE_SIZE = int(os.getenv("WORK_QUEUE_SIZE", "1000"))
+
+# Look at raw UpdateNewChannelMessage first and build Telethon events
+# only for posts with a keyboard; basic groups get events built from their
+# own raw updates. 0 = plain events.NewMessage for everything
+RAW_PREFILTER = os.getenv("RAW_PREFILTER", "1") == "1"
 
 # Auto-restart settings
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))
 RETRY_DELAY = int(os.getenv("RETRY_DELAY", "10"))
 
+# "fast": keep one client (entity cache, handlers, login) and reconnect it
+# with jittered exponential backoff; MAX_RETRIES counts failures in a row.
+# "rebuild": old behaviour - new client after RETRY_DELAY, MAX_RETRIES total
+RECONNECT_MODE = os.getenv("RECONNECT_MODE", "fast").lower()
+RECONNECT_BASE_DELAY = float(os.getenv("RECONNECT_BASE_DELAY", "0.25"))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "30"))
+
+# Claims over their own MTProto connection to the home DC (same login, no
+# updates), kept warm with a ping every CLAIM_KEEPALIVE seconds; falls back
+# to the main connection while it is down
+CLAIM_CONNECTION = os.getenv("CLAIM_CONNECTION", "0") == "1"
+CLAIM_KEEPALIVE = float(os.getenv("CLAIM_KEEPALIVE", "20"))
+
+# Seconds to wait for a bot's reply to a /start claim before counting it
+# as unanswered (replies say won / already claimed / expired)
+CONFIRM_WINDOW = float(os.getenv("CONFIRM_WINDOW", "30"))
+
+# Sampling profiler for the event loop: PROFILE=1 profiles from startup,
+# SIGUSR2 toggles it at runtime. Collapsed stacks (CPU on the loop and
+# task await chains) and a loop lag CSV are written to PROFILE_DIR on stop.
+PROFILE = os.getenv("PROFILE", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Logging: level for everything (DEBUG also enables Telethon internals),
+# optional structured JSON file with rotation
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_JSON_FILE = os.getenv("LOG_JSON_FILE", "")
+LOG_JSON_MAX_MB = int(os.getenv("LOG_JSON_MAX_MB", "10"))
+LOG_JSON_BACKUPS = int(os.getenv("LOG_JSON_BACKUPS", "3"))
+
+# HTTP server for /metrics, /healthz and /readyz (0 = disabled); on
+# Railway it listens on $PORT unless METRICS_PORT is set
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", os.getenv("PORT", "0")))
+
+# Stall watchdog: every WATCHDOG_INTERVAL seconds (0 = off) check how long
+# updates have been silent. The allowed silence is STALL_FACTOR typical gaps
+# between updates, kept within STALL_MIN_SECONDS..STALL_MAX_SECONDS; longer
+# silence triggers a probe and, if it fails, a fast reconnect
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "15"))
+STALL_FACTOR = float(os.getenv("STALL_FACTOR", "20"))
+STALL_MIN_SECONDS = float(os.getenv("STALL_MIN_SECONDS", "120"))
+STALL_MAX_SECONDS = float(os.getenv("STALL_MAX_SECONDS", "1800"))
+
+# Capture mode: append every incoming message's buttons to a JSONL corpus
+# (replay it with bench_replay.py)
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", "")
+
 # ============================================================================
 # LOGGING SETUP
 # ============================================================================
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s | %(levelname)-7s | %(message)s",
-    datefmt="%H:%M:%S",
-    handlers=[logging.StreamHandler(sys.stdout)]
+# Records go through a bounded queue; stdout/file writes happen in a
+# listener thread, never on the event loop
+_log_queue_handler, _log_listener = setup_logging(
+    level=LOG_LEVEL,
+    json_file=LOG_JSON_FILE,
+    json_max_mb=LOG_JSON_MAX_MB,
+    json_backups=LOG_JSON_BACKUPS,
 )
+atexit.register(stop_logging, _log_listener)
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -73,14 +199,23 @@ class Stats:
         self.start_time = None
         self.messages_total = 0
         self.messages_with_buttons = 0
+        self.messages_with_text_links = 0  # check links in text/entities
         self.gifts_detected = 0
         self.gifts_claimed = 0
         self.gifts_failed = 0
         self.last_message_time = None
         self.last_gift_time = None
         self.restarts = 0
+        self.last_reconnect_ms = None
         self.preloaded_bots = 0
         self.codes_skipped = 0  # Codes filtered out
+        self.duplicates_skipped = 0  # Claims already sent before
+        self.edits_total = 0
+        self.edits_with_new_buttons = 0
+        self.catchup_messages = 0  # Missed posts with buttons replayed after reconnect
+        self.raw_skipped = 0  # Button-less posts dropped by the raw prefilter
+        self.multi_claim_messages = 0  # Messages where several claims were sent at once
+        self.claim_results = Counter()  # (claim type, "ok"/"error") -> count
     
     def uptime(self):
         if not self.start_time:
@@ -96,41 +231,195 @@ class Stats:
 
 stats = Stats()
 
+# ============================================================================
+# METRICS
+# ============================================================================
+# Stage latencies, all measured from the moment the update was received:
+#   classified - buttons analysed
+#   sent       - claim RPC handed to Telethon
+#   acked      - claim RPC answered
+#   rpc        - sent -> acked (network + bot)
+# claim_rpc splits the RPC time by the connection it went over
+metrics = Metrics()
+metrics.histogram("claim_stage", ("stage", "channel", "bot", "type"),
+                  "Claim pipeline latency by stage")
+metrics.histogram("claim_rpc", ("link", "type"), "Claim RPC time by connection (dedicated/shared)")
+metrics.histogram("claim_link_ping", (), "Keepalive ping round trip on the claim connection")
+metrics.histogram("claim_confirm", ("type", "outcome"), "Claim sent -> bot confirmed (reply or callback answer)")
+metrics.histogram("reconnect", (), "Time from disconnect to monitoring again")
+metrics.histogram("queue_wait", ("lane",), "Time an update waited for a worker")
+metrics.histogram("session_flush", ("phase",), "Session snapshot: in-loop copy and threaded write")
+
+def _stats_metrics() -> dict:
+    return {
+        "messages_total": ("counter", "Messages received", stats.messages_total),
+        "messages_with_buttons_total": ("counter", "Messages with buttons", stats.messages_with_buttons),
+        "messages_with_text_links_total": ("counter", "Messages with check links in text or entities", stats.messages_with_text_links),
+        "gifts_detected_total": ("counter", "Gift buttons/codes detected", stats.gifts_detected),
+        "gifts_claimed_total": ("counter", "Claims sent successfully", stats.gifts_claimed),
+        "gifts_failed_total": ("counter", "Claims that raised an error", stats.gifts_failed),
+        "claims_total": ("counter", "Claims sent by type and result", {
+            f'{{type="{claim_type}",result="{result}"}}': count
+            for (claim_type, result), count in stats.claim_results.items()
+        }),
+        "claims_confirmed_total": ("counter", "Claim outcomes from bot replies by type", {
+            f'{{type="{claim_type}",outcome="{outcome}"}}': count
+            for (claim_type, outcome), count in confirmations.counts.items()
+        }),
+        "claims_awaiting_reply": ("gauge", "Sent /start claims waiting for the bot's reply", len(confirmations)),
+        "multi_claim_messages_total": ("counter", "Messages with several claims sent at once", stats.multi_claim_messages),
+        "codes_skipped_total": ("counter", "Start codes with ignore prefix", stats.codes_skipped),
+        "raw_skipped_total": ("counter", "Button-less posts counted by the raw prefilter", stats.raw_skipped),
+        "edits_total": ("counter", "Message edits received", stats.edits_total),
+        "edits_with_new_buttons_total": ("counter", "Edits that added or changed buttons", stats.edits_with_new_buttons),
+        "dedup_hits_total": ("counter", "Claims skipped as duplicates", dedup.hits),
+        "dedup_misses_total": ("counter", "Claims checked and not seen before", dedup.misses),
+        "deeplink_cache_hits_total": ("counter", "Button URLs parsed from cache", deeplink_cache_stats()[0]),
+        "deeplink_cache_misses_total": ("counter", "Button URLs parsed from scratch", deeplink_cache_stats()[1]),
+        "dedup_entries": ("gauge", "Entries in the duplicate cache", len(dedup)),
+        "restarts_total": ("counter", "Client restarts", stats.restarts),
+        "catchup_messages_total": ("counter", "Missed posts with buttons processed after reconnect", stats.catchup_messages),
+        "preloaded_bots": ("gauge", "Bots resolved at startup", stats.preloaded_bots),
+        "channels_monitored": ("gauge", "Channels in the monitored set", len(monitored)),
+        "channels_memory_bytes": ("gauge", "Approximate size of the monitored set", monitored.memory_bytes()),
+        "uptime_seconds": ("gauge", "Seconds since monitoring started",
+                           int(time.time() - stats.start_time) if stats.start_time else 0),
+    }
+
+metrics.add_provider(_stats_metrics)
+
+def _notifier_metrics() -> dict:
+    if not _notifier:
+        return {}
+    c = _notifier.counters()
+    return {
+        "notifications_submitted_total": ("counter", "Notifications queued", c["submitted"]),
+        "notifications_sent_total": ("counter", "Notification messages sent", c["sent"]),
+        "notifications_dropped_total": ("counter", "Notifications dropped (queue full)", c["dropped"]),
+        "notifications_coalesced_total": ("counter", "Notifications merged into digests", c["coalesced"]),
+        "notifications_deferred_total": ("counter", "Digests held back by claims in flight", c["deferred"]),
+        "notifications_failed_total": ("counter", "Digests that failed to send", c["failed"]),
+        "notifications_queued": ("gauge", "Notifications waiting", c["queued"]),
+    }
+
+metrics.add_provider(_notifier_metrics)
+
+def _scheduler_metrics() -> dict:
+    if not _scheduler:
+        return {}
+    c = _scheduler.counters()
+    return {
+        "work_submitted_total": ("counter", "Updates queued for workers", c["submitted"]),
+        "work_blocked_total": ("counter", "Updates that waited for queue space", c["blocked"]),
+        "work_dropped_total": ("counter", "Button-less updates dropped (cheap lane full)", c["dropped"]),
+        "work_failed_total": ("counter", "Updates whose processing raised", c["failed"]),
+        "work_busy": ("gauge", "Workers processing an update", c["busy"]),
+        "work_queue_depth": ("gauge", "Updates waiting per lane", {
+            '{lane="main"}': c["depth_main"], '{lane="cheap"}': c["depth_cheap"],
+        }),
+        "work_queue_max_depth": ("gauge", "Highest main queue depth seen", c["max_depth"]),
+    }
+
+metrics.add_provider(_scheduler_metrics)
+
+def _watchdog_metrics() -> dict:
+    if not _watchdog:
+        return {}
+    now = time.perf_counter()
+    return {
+        "watchdog_probes_total": ("counter", "Probes sent after suspicious silence", _watchdog.probes),
+        "watchdog_stalls_total": ("counter", "Reconnects forced by the watchdog", _watchdog.stalls),
+        "update_silence_seconds": ("gauge", "Seconds since the last update", round(activity.silence(now), 3)),
+        "stall_threshold_seconds": ("gauge", "Silence that triggers a probe", round(_watchdog.threshold(), 3)),
+        "loop_lag_seconds": ("gauge", "Event loop lag seen by the watchdog", round(_watchdog.loop_lag, 6)),
+    }
+
+metrics.add_provider(_watchdog_metrics)
+
+def _claim_link_metrics() -> dict:
+    if not _claim_link:
+        return {}
+    return {
+        "claim_link_up": ("gauge", "Claim connection is connected", int(_claim_link.ready)),
+        "claim_link_connects_total": ("counter", "Claim connection (re)connects", _claim_link.connects),
+        "claim_link_failures_total": ("counter", "Failed claim connection pings/connects", _claim_link.failures),
+    }
+
+metrics.add_provider(_claim_link_metrics)
+
+def _rule_metrics() -> dict:
+    counts = rule_hits.counts(rules)
+    return {
+        "rules_loaded": ("gauge", "Rules in the active rule set", len(rules)),
+        "rule_hits_total": ("counter", "Matches per rule", {
+            f'{{list="{name}",rule="{escape_label(rule)}"}}': hits for (name, rule), hits in counts.items()
+        }),
+    }
+
+metrics.add_provider(_rule_metrics)
+
+def observe_claim(chat_id, bot: str, claim_type: str, received: float,
+                  classified: float, sent: Optional[float] = None, acked: Optional[float] = None):
+    """Record stage latencies (perf_counter timestamps) for one message."""
+    labels = (str(chat_id), bot, claim_type)
+    metrics.observe("claim_stage", ("classified",) + labels, int((classified - received) * 1e6))
+    if sent is None:
+        return
+    metrics.observe("claim_stage", ("sent",) + labels, int((sent - received) * 1e6))
+    metrics.observe("claim_stage", ("acked",) + labels, int((acked - received) * 1e6))
+    metrics.observe("claim_stage", ("rpc",) + labels, int((acked - sent) * 1e6))
+
+def render_metrics() -> tuple[int, str, str]:
+    return 200, "text/plain; version=0.0.4", metrics.render()
+
+class PhaseTimer:
+    """Measures consecutive startup phases."""
+    def __init__(self):
+        self.phases = []
+        self._last = time.perf_counter()
+        self._start = self._last
+    
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.phases.append((name, int((now - self._last) * 1000)))
+        self._last = now
+    
+    def summary(self) -> str:
+        total = int((self._last - self._start) * 1000)
+        parts = [f"{name} {ms}ms" for name, ms in self.phases]
+        return " | ".join(parts + [f"всего {total}ms"])
+
 # Global client reference for notifications
 _client: Optional[TelegramClient] = None
 
+# Corpus writer (only when CAPTURE_FILE is set)
+_capture: Optional[CorpusWriter] = None
+
 # ============================================================================
 # NOTIFICATIONS
 # ============================================================================
-async def notify(message: str, silent: bool = False):
-    """Send notification to user (Saved Messages by default)."""
+# Background notifier (created in main(), survives restarts)
+_notifier: Optional[Notifier] = None
+# Dedicated claim connection (CLAIM_CONNECTION=1)
+_claim_link: Optional[ClaimLink] = None
+# Claim RPCs currently awaiting an answer; notifications wait for zero
+_claims_in_flight = 0
+
+async def _send_notification(message: str, silent: bool):
     if not _client:
-        return
-    try:
-        await _client.send_message(NOTIFY_USER, message, silent=silent)
-        logger.debug(f"📤 Уведомление отправлено: {message[:50]}...")
-    except Exception as e:
-        logger.warning(f"⚠️ Не удалось отправить уведомление: {e}")
+        raise RuntimeError("client is not connected")
+    await _client.send_message(NOTIFY_USER, message, silent=silent)
+
+def notify(message: str, silent: bool = False):
+    """Queue notification to user (Saved Messages by default). Never blocks."""
+    if _notifier:
+        _notifier.submit(message, silent)
 
-async def notify_gift(bot: str, code: str, elapsed_ms: int, success: bool):
-    """Send gift notification."""
+def notify_gift(bot: str, code: str, elapsed_ms: int, success: bool,
+                verdict: Optional[CodeVerdict] = None):
+    """Send gift notification. Reuses the verdict computed by smart_claim."""
     status = "✅ УСПЕХ" if success else "❌ ОШИБКА"
-    
-    # Determine code type
-    code_type = "неизвестный"
-    code_lower = code.lower()
-    
-    # Check giveaways first
-    for prefix in GIVEAWAY_CODE_PREFIXES:
-        if code_lower.startswith(prefix):
-            code_type = f"розыгрыш ({prefix.rstrip('_')})"
-            break
-    else:
-        # Then check gifts
-        for prefix in GIFT_CODE_PREFIXES:
-            if code_lower.startswith(prefix):
-                code_type = prefix.rstrip('_')
-                break
+    code_type = verdict.code_type if verdict else "неизвестный"
     
     msg = f"""🎁 **ПОДАРОК {status}**
 
@@ -144,32 +433,159 @@ async def notify_gift(bot: str, code: str, elapsed_ms: int, success: bool):
    Пропущено: {stats.codes_skipped}
 
 ⏰ {datetime.now().strftime('%H:%M:%S')}"""
-    await notify(msg)
+    notify(msg)
 
 # ============================================================================
-# BOT PRELOADING
+# BOT PRELOADING & PEER CACHE
 # ============================================================================
-async def preload_bots(client: TelegramClient):
-    """Preload bots to warm up connections for faster claiming."""
-    logger.info(f"🔄 Предзагрузка ботов для ускорения...")
+# Lowercase bot username -> ready InputPeerUser, so claim RPCs never wait
+# for username resolution
+_peers: dict = {}
+# Channel id -> InputPeerChannel for callback presses
+_chat_peers: dict = {}
+# Config entry (TARGET_CHANNELS / CHANNELS_FILE) -> peer id it resolved to
+_channel_keys: dict = {}
+# Entries read from CHANNELS_FILE
+_file_channels: list = []
+# Peer ids being monitored; replaced as a whole when the list changes
+monitored = ChannelSet()
+# Usernames currently being resolved in the background
+_resolving: set = set()
+# Account the cached access hashes belong to
+_me = None
+# Owner id stored in the loaded snapshot
+_snapshot_owner: Optional[int] = None
+
+def learn_bot(client, username: str):
+    """Resolve an unknown bot in the background and add it to the cache."""
+    key = username.lower()
+    if key in _peers or key in _resolving:
+        return
+    _resolving.add(key)
+    asyncio.create_task(_learn_bot(client, key))
+
+async def _learn_bot(client, key: str):
+    try:
+        _peers[key] = await client.get_input_entity(key)
+        logger.info(f"🤖 @{key} добавлен в кэш")
+    except Exception as e:
+        logger.debug(f"   Не удалось разрешить @{key}: {e}")
+    finally:
+        _resolving.discard(key)
+
+def _peer_to_dict(peer) -> Optional[dict]:
+    if isinstance(peer, types.InputPeerUser):
+        return {"type": "user", "id": peer.user_id, "hash": peer.access_hash}
+    if isinstance(peer, types.InputPeerChannel):
+        return {"type": "channel", "id": peer.channel_id, "hash": peer.access_hash}
+    if isinstance(peer, types.InputPeerChat):
+        return {"type": "chat", "id": peer.chat_id}
+    return None
+
+def _peer_from_dict(data: dict):
+    if data["type"] == "user":
+        return types.InputPeerUser(data["id"], data["hash"])
+    if data["type"] == "channel":
+        return types.InputPeerChannel(data["id"], data["hash"])
+    return types.InputPeerChat(data["id"])
+
+def load_entity_snapshot() -> int:
+    """Fill peer caches from ENTITY_SNAPSHOT. Returns number of entries."""
+    global _snapshot_owner
+    if not ENTITY_SNAPSHOT or not os.path.exists(ENTITY_SNAPSHOT):
+        return 0
+    try:
+        with open(ENTITY_SNAPSHOT, encoding="utf-8") as f:
+            data = json.load(f)
+        for name, peer in data.get("bots", {}).items():
+            _peers[name] = _peer_from_dict(peer)
+        for key, chan in data.get("channels", {}).items():
+            peer_id = chan["peer_id"]
+            _channel_keys[key] = peer_id
+            _chat_peers[peer_id] = _peer_from_dict(chan)
+            _chat_titles[peer_id] = chan.get("title", "Unknown")
+        _snapshot_owner = data.get("owner")
+        return len(data.get("bots", {})) + len(data.get("channels", {}))
+    except Exception as e:
+        logger.warning(f"⚠️ Снимок {ENTITY_SNAPSHOT} не прочитан: {e}")
+        return 0
+
+def save_entity_snapshot():
+    """Write peer caches to ENTITY_SNAPSHOT (atomically)."""
+    if not ENTITY_SNAPSHOT or not _me:
+        return
+    bots = {}
+    for name, peer in _peers.items():
+        data = _peer_to_dict(peer)
+        if data:
+            bots[name] = data
+    channels = {}
+    for key, peer_id in _channel_keys.items():
+        data = _peer_to_dict(_chat_peers.get(peer_id))
+        if data:
+            data["peer_id"] = peer_id
+            data["title"] = _chat_titles.get(peer_id, "Unknown")
+            channels[key] = data
+    tmp_path = f"{ENTITY_SNAPSHOT}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"owner": _me.id, "bots": bots, "channels": channels}, f)
+        os.replace(tmp_path, ENTITY_SNAPSHOT)
+        logger.debug(f"💾 Снимок сохранен: {len(bots)} ботов, {len(channels)} каналов")
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось сохранить снимок: {e}")
+
+def check_snapshot_owner():
+    """Drop cached access hashes if the snapshot belongs to another account."""
+    global _snapshot_owner
+    if _snapshot_owner is not None and _me and _snapshot_owner != _me.id:
+        logger.warning("⚠️ Снимок от другого аккаунта — сбрасываю кэш")
+        _peers.clear()
+        _chat_peers.clear()
+        _channel_keys.clear()
+        _chat_titles.clear()
+    _snapshot_owner = None
+
+async def _gather_limited(items, worker):
+    """Run worker(index, item) for all items, PRELOAD_CONCURRENCY at a time."""
+    semaphore = asyncio.Semaphore(max(1, PRELOAD_CONCURRENCY))
     
+    async def run(i, item):
+        async with semaphore:
+            return await worker(i, item)
+    
+    return await asyncio.gather(*(run(i, item) for i, item in enumerate(items, 1)))
+
+async def preload_bots(client: TelegramClient, refresh: bool = False):
+    """Preload bots to warm up connections for faster claiming.
+
+    Bots already cached (e.g. from the snapshot) are skipped unless refresh.
+    """
+    pending = [bot for bot in PRELOAD_BOTS if refresh or bot.lower() not in _peers]
+    if not pending:
+        logger.info(f"🔄 Все боты уже в кэше ({len(PRELOAD_BOTS)}), предзагрузка не нужна")
+        stats.preloaded_bots = len(PRELOAD_BOTS)
+        return
+    
+    logger.info(f"🔄 Предзагрузка ботов для ускорения ({len(pending)}, по {PRELOAD_CONCURRENCY})...")
     start_time = time.time()
-    success_count = 0
     
-    for i, bot in enumerate(PRELOAD_BOTS, 1):
-        logger.info(f"   [{i}/{len(PRELOAD_BOTS)}] Проверяю @{bot}...")
+    async def resolve(i, bot):
         try:
             entity = await client.get_entity(bot)
-            stats.preloaded_bots += 1
-            success_count += 1
+            _peers[bot.lower()] = utils.get_input_peer(entity)
             bot_name = getattr(entity, 'first_name', 'No name')
-            logger.info(f"      ✅ @{bot} | {bot_name} (ID: {entity.id})")
+            logger.info(f"   [{i}/{len(pending)}] ✅ @{bot} | {bot_name} (ID: {entity.id})")
+            return True
         except Exception as e:
-            logger.warning(f"      ⚠️ @{bot} не найден: {e}")
-        await asyncio.sleep(0.2)  # Avoid flood
+            logger.warning(f"   [{i}/{len(pending)}] ⚠️ @{bot} не найден: {e}")
+            return False
+    
+    results = await _gather_limited(pending, resolve)
+    stats.preloaded_bots = sum(1 for bot in PRELOAD_BOTS if bot.lower() in _peers)
     
     elapsed = int((time.time() - start_time) * 1000)
-    logger.info(f"🔄 Предзагрузка завершена за {elapsed}ms: {success_count}/{len(PRELOAD_BOTS)} ботов готовы")
+    logger.info(f"🔄 Предзагрузка завершена за {elapsed}ms: {sum(results)}/{len(pending)} ботов готовы")
 
 # ============================================================================
 # VALIDATION
@@ -181,8 +597,8 @@ def validate_config():
         errors.append("API_ID not set")
     if not API_HASH:
         errors.append("API_HASH not set")
-    if not TARGET_CHANNELS:
-        errors.append("TARGET_CHANNELS not set")
+    if not TARGET_CHANNELS and not CHANNELS_FILE:
+        errors.append("TARGET_CHANNELS or CHANNELS_FILE not set")
     
     if errors:
         for err in errors:
@@ -193,19 +609,48 @@ def validate_config():
 # ============================================================================
 # CLIENT SETUP
 # ============================================================================
+# In-memory session and its background snapshot writer (SESSION_BACKEND=memory)
+_session: Optional[SnapshotSession] = None
+_session_flusher: Optional[SessionFlusher] = None
+
+def open_memory_session():
+    """Load or migrate the in-memory session and start snapshotting it."""
+    global _session, _session_flusher
+    _session, source = open_session(SESSION_SNAPSHOT, sqlite_path=f"{SESSION_NAME}.session",
+                                    string=STRING_SESSION)
+    sources = {"snapshot": "снимок", "string": "STRING_SESSION", "sqlite": f"{SESSION_NAME}.session", "new": "новая"}
+    logger.info(f"🔑 Сессия в памяти: {SESSION_SNAPSHOT} (источник: {sources[source]}, "
+                f"{len(_session._entities)} сущностей)")
+    _session_flusher = SessionFlusher(
+        _session, SESSION_SNAPSHOT, SESSION_FLUSH_INTERVAL,
+        on_flush=lambda copy_us, write_us: (metrics.observe("session_flush", ("copy",), copy_us),
+                                            metrics.observe("session_flush", ("write",), write_us)),
+    )
+    _session_flusher.start()
+
 def create_client():
-    """Create Telegram client with appropriate session."""
-    if STRING_SESSION:
+    """Create Telegram client with appropriate session.
+
+    Updates are dispatched sequentially: handlers only classify and queue
+    work, and a full worker queue then holds back Telethon's update loop
+    instead of piling up one parked task per update.
+    """
+    if _session is not None:
+        session = _session
+    elif STRING_SESSION:
         logger.info("Using StringSession for authentication")
-        return TelegramClient(StringSession(STRING_SESSION), int(API_ID), API_HASH)
+        session = StringSession(STRING_SESSION)
     else:
         logger.info(f"Using file session: {SESSION_NAME}")
-        return TelegramClient(SESSION_NAME, int(API_ID), API_HASH)
+        session = SESSION_NAME
+    return TelegramClient(session, int(API_ID), API_HASH, sequential_updates=True)
 
 # ============================================================================
 # GIFT CLAIMING LOGIC
 # ============================================================================
 
+# Built-in rules; any list can be overridden from RULES_FILE
+
 # Prefixes of REAL gift/check codes (case-insensitive)
 GIFT_CODE_PREFIXES = [
     'chk_',      # anonimgifterbot checks
@@ -262,250 +707,726 @@ WHITELIST = [
     'receive', 'collect', 'activate'
 ]
 
-def is_gift_code(code: str) -> tuple[bool, str]:
-    """Check if code looks like a real gift. Returns (is_gift, reason)."""
-    code_lower = code.lower()
-    
-    # First check if it's a giveaway code
-    for prefix in GIVEAWAY_CODE_PREFIXES:
-        if code_lower.startswith(prefix):
-            return True, f"розыгрыш '{prefix}'"
-    
-    # Then check if it's in ignore list
-    for prefix in IGNORE_CODE_PREFIXES:
-        if code_lower.startswith(prefix):
-            return False, f"игнор-префикс '{prefix}'"
-    
-    # Then check if it's a known gift prefix
-    for prefix in GIFT_CODE_PREFIXES:
-        if code_lower.startswith(prefix):
-            return True, f"подарок '{prefix}'"
-    
-    # Unknown prefix - still try (might be new format)
-    return True, "неизвестный формат (пробуем)"
+DEFAULT_RULES = {
+    "gift_code_prefixes": GIFT_CODE_PREFIXES,
+    "giveaway_code_prefixes": GIVEAWAY_CODE_PREFIXES,
+    "ignore_code_prefixes": IGNORE_CODE_PREFIXES,
+    "giveaway_bots": GIVEAWAY_BOTS,
+    "giveaway_url_patterns": GIVEAWAY_URL_PATTERNS,
+    "blacklist": BLACKLIST,
+    "whitelist": WHITELIST,
+}
+
+# Active rules compiled into a single-pass classifier:
+# giveaway prefixes win over ignore prefixes, ignore wins over gift,
+# unknown prefixes are still tried (might be new format).
+# Swapped as a whole on reload (see apply_rules)
+rules = build_rules({}, DEFAULT_RULES, "built-in")
+classifier = rules.classifier
+rule_hits = RuleHits()
+
+def apply_rules(ruleset: RuleSet):
+    """Atomically switch to a new compiled rule set."""
+    global rules, classifier
+    rules, classifier = ruleset, ruleset.classifier
+
+# What smart_claim decided for a single button
+STEP_BLACKLIST = "blacklist"    # text matched BLACKLIST
+STEP_CALLBACK = "callback"      # press callback button
+STEP_GIVEAWAY = "giveaway"      # press giveaway button
+STEP_START = "start"            # send /start <code> to bot
+STEP_SKIP_CODE = "skip_code"    # start code has ignore prefix
+STEP_NO_BOT = "no_bot"          # code found but no bot to send it to
+STEP_PASS = "pass"              # nothing to do
+
+CLAIM_STEPS = (STEP_CALLBACK, STEP_GIVEAWAY, STEP_START)
 
-async def smart_claim(client, event):
-    """Detect and claim gifts from message buttons."""
-    message = event.message
-    claim_start = time.time()
-    
-    if not message.buttons:
-        return False
-    
-    stats.messages_with_buttons += 1
-    button_count = sum(len(row) for row in message.buttons)
-    logger.info(f"🔘 Сообщение с кнопками! Найдено кнопок: {button_count}")
 
-    for row_idx, row in enumerate(message.buttons):
+class ButtonStep(NamedTuple):
+    """Decision for one button; formatted into logs only after the claim."""
+    row: int
+    col: int
+    btn: object
+    action: str
+    verdict: ButtonVerdict
+    start_param: Optional[str] = None
+    code_verdict: Optional[CodeVerdict] = None
+    target_bot: Optional[str] = None
+    url_verdict: Optional[UrlVerdict] = None
+
+
+def plan_buttons(rows) -> list[ButtonStep]:
+    """Decide what to do with every button. No logging, no I/O."""
+    steps = []
+    for row_idx, row in enumerate(rows):
         for btn_idx, btn in enumerate(row):
             btn_text = (btn.text or "").lower()
-            btn_display = btn.text or "[Без текста]"
-            
-            # Log each button
-            btn_type = "URL" if btn.url else ("CALLBACK" if btn.data else "OTHER")
-            logger.debug(f"   [{row_idx}:{btn_idx}] {btn_type}: '{btn_display}'")
-            
-            # Blacklist check
-            matched_blacklist = [w for w in BLACKLIST if w in btn_text]
-            if matched_blacklist:
-                logger.debug(f"   ⛔ Пропуск (blacklist: {matched_blacklist})")
+
+            # Blacklist + whitelist check in one pass
+            verdict = classifier.classify_button(btn_text)
+            if verdict.blocked:
+                steps.append(ButtonStep(row_idx, btn_idx, btn, STEP_BLACKLIST, verdict))
                 continue
 
-            # Whitelist check
-            matched_whitelist = [w for w in WHITELIST if w in btn_text]
-            is_gift_text = len(matched_whitelist) > 0
-            
-            if is_gift_text:
-                logger.info(f"   ✨ СОВПАДЕНИЕ! Триггеры: {matched_whitelist}")
-                stats.gifts_detected += 1
+            is_gift_text = verdict.is_gift_text
 
             # Option 1: Callback button (no URL)
             if btn.data and (is_gift_text or not btn_text):
-                logger.info(f"🎯 CALLBACK кнопка: '{btn_display}'")
-                try:
-                    await client(GetBotCallbackAnswerRequest(
-                        peer=event.chat_id,
-                        msg_id=message.id,
-                        data=btn.data
-                    ))
-                    elapsed = int((time.time() - claim_start) * 1000)
-                    logger.info(f"✅ УСПЕХ! Callback нажат за {elapsed}ms")
-                    stats.gifts_claimed += 1
-                    stats.last_gift_time = datetime.now()
-                    asyncio.create_task(notify_gift("callback", btn_display, elapsed, True))
-                    return True
-                except Exception as e:
-                    logger.warning(f"⚠️ Ошибка callback (попытка засчитана): {e}")
-                    stats.gifts_failed += 1
-                    asyncio.create_task(notify_gift("callback", btn_display, 0, False))
-                    return True
+                steps.append(ButtonStep(row_idx, btn_idx, btn, STEP_CALLBACK, verdict))
+                continue
 
             # Option 2: URL button (Activate check)
-            if btn.url:
-                url = btn.url.lower()
-                original_url = btn.url
-                start_param = None
-                target_bot = None
-                is_giveaway = False
-
-                # Check if this is a giveaway/lottery URL - we want to JOIN these!
-                for pattern in GIVEAWAY_URL_PATTERNS:
-                    if pattern in url:
-                        logger.info(f"🎰 РОЗЫГРЫШ: паттерн '{pattern}' — участвуем!")
-                        is_giveaway = True
-                        break
-
-                # Check if URL is from giveaway bot
-                if not is_giveaway:
-                    for bot in GIVEAWAY_BOTS:
-                        if f"t.me/{bot}" in url or f"/{bot}/" in url:
-                            logger.info(f"🎰 РОЗЫГРЫШ: бот @{bot} — участвуем!")
-                            is_giveaway = True
-                            break
-
-                # Extract start parameter (gift code)
-                if "start=" in url:
-                    start_param = url.split("start=")[1].split("&")[0]
-                elif "startapp=" in url:
-                    start_param = url.split("startapp=")[1].split("&")[0]
-                
-                if start_param:
-                    # Check if this is a real gift code
-                    is_gift, reason = is_gift_code(start_param)
-                    
-                    if not is_gift:
-                        logger.info(f"⏭️ ПРОПУСК: код '{start_param[:25]}' — {reason}")
-                        stats.codes_skipped += 1
-                        continue
-                    
-                    # Determine if it's a giveaway by the reason
-                    is_giveaway_code = "розыгрыш" in reason
-                    
-                    if is_giveaway_code:
-                        logger.info(f"🎰 Код розыгрыша: {start_param}")
-                    else:
-                        logger.info(f"🔗 URL кнопка с кодом: {start_param}")
-                    
-                    logger.info(f"   📋 Анализ: {reason}")
-                    stats.gifts_detected += 1
-                    
-                    # Try to extract bot username from URL
-                    if "t.me/" in url:
-                        try:
-                            target_bot = url.split("t.me/")[1].split("?")[0].replace("/", "")
-                        except Exception:
-                            pass
-                    elif "tg://resolve" in url:
-                        try:
-                            target_bot = url.split("domain=")[1].split("&")[0]
-                        except Exception:
-                            pass
-                    
-                    # Fallback to default bot if text matches
-                    if not target_bot and is_gift_text:
-                        target_bot = DEFAULT_GIFT_BOT
-                        logger.debug(f"   Бот не найден в URL, использую дефолт: @{target_bot}")
-
-                    # Send command to bot
-                    if target_bot:
-                        if is_giveaway_code:
-                            # For giveaways, just press the button (don't send command)
-                            logger.info(f"🎰 Нажимаю кнопку розыгрыша")
-                            try:
-                                # Simulate button press by clicking the original button
-                                await client(GetBotCallbackAnswerRequest(
-                                    peer=event.chat_id,
-                                    msg_id=message.id,
-                                    data=btn.data if btn.data else None
-                                ))
-                                elapsed = int((time.time() - claim_start) * 1000)
-                                logger.info(f"✅ УСПЕХ! Кнопка розыгрыша нажата за {elapsed}ms")
-                                stats.gifts_claimed += 1
-                                stats.last_gift_time = datetime.now()
-                                asyncio.create_task(notify_gift(target_bot, start_param, elapsed, True))
-                                return True
-                            except Exception as e:
-                                logger.error(f"❌ ОШИБКА нажатия кнопки: {e}")
-                                stats.gifts_failed += 1
-                                asyncio.create_task(notify_gift(target_bot, start_param, 0, False))
-                                return True
-                        else:
-                            # For regular gifts, send /start with code
-                            logger.info(f"🎯 Отправляю /start @{target_bot}")
-                            try:
-                                await client.send_message(target_bot, f"/start {start_param}")
-                                elapsed = int((time.time() - claim_start) * 1000)
-                                logger.info(f"✅ УСПЕХ! /start отправлен за {elapsed}ms")
-                                stats.gifts_claimed += 1
-                                stats.last_gift_time = datetime.now()
-                                asyncio.create_task(notify_gift(target_bot, start_param, elapsed, True))
-                                return True
-                            except FloodWaitError as e:
-                                logger.error(f"🚫 FLOOD WAIT: {e.seconds}s")
-                                stats.gifts_failed += 1
-                                asyncio.create_task(notify_gift(target_bot, start_param, 0, False))
-                                return True
-                            except Exception as e:
-                                logger.error(f"❌ ОШИБКА отправки /start: {e}")
-                                stats.gifts_failed += 1
-                                asyncio.create_task(notify_gift(target_bot, start_param, 0, False))
-                                return True
-                    else:
-                        logger.debug(f"   URL без бота: {original_url[:50]}")
-    
-    return False
+            if not btn.url:
+                steps.append(ButtonStep(row_idx, btn_idx, btn, STEP_PASS, verdict))
+                continue
+
+            # Check if this is a giveaway/lottery URL or giveaway bot - we want to JOIN these!
+            url_verdict = classifier.classify_url(btn.url.lower())
+
+            # Extract bot and start parameter (gift code)
+            link = parse_link(btn.url)
+            start_param = link.start_param if link else None
+
+            if not start_param:
+                steps.append(ButtonStep(row_idx, btn_idx, btn, STEP_PASS, verdict,
+                                        url_verdict=url_verdict))
+                continue
+
+            # Check if this is a real gift code
+            code_verdict = classifier.classify_code(start_param)
+            if not code_verdict.is_claimable:
+                steps.append(ButtonStep(row_idx, btn_idx, btn, STEP_SKIP_CODE, verdict,
+                                        start_param, code_verdict,
+                                        url_verdict=url_verdict))
+                continue
+
+            target_bot = link.bot
+
+            # Fallback to default bot if text matches
+            if not target_bot and is_gift_text:
+                target_bot = DEFAULT_GIFT_BOT
+
+            if not target_bot:
+                steps.append(ButtonStep(row_idx, btn_idx, btn, STEP_NO_BOT, verdict,
+                                        start_param, code_verdict,
+                                        url_verdict=url_verdict))
+                continue
+
+            # A giveaway link in the text has no button to press: /start it
+            action = STEP_GIVEAWAY if code_verdict.is_giveaway and type(btn) is not TextLink else STEP_START
+            steps.append(ButtonStep(row_idx, btn_idx, btn, action, verdict,
+                                    start_param, code_verdict, target_bot, url_verdict))
+    return steps
+
+
+async def send_claim(client, event, step: ButtonStep) -> tuple[Optional[Exception], float, float, Optional[str]]:
+    """Issue the claim RPC for a planned step.
+
+    Returns (error or None, perf_counter time the RPC was handed over,
+    perf_counter time it was answered or failed, callback answer text for
+    button presses). The RPC goes over the claim connection when it is up.
+    """
+    global _claims_in_flight
+    conn, link = _claim_link.pick(client) if _claim_link else (client, LINK_SHARED)
+    error, answer = None, None
+    sent = time.perf_counter()
+    _claims_in_flight += 1
+    try:
+        if step.action == STEP_START:
+            # Cached InputPeer skips username resolution; unknown bots go
+            # by username once and are learned afterwards
+            peer = _peers.get(step.target_bot) or step.target_bot
+            await conn.send_message(peer, f"/start {step.start_param}")
+        else:
+            # Callback and giveaway buttons are pressed directly. The claim
+            # connection has no entity cache: take the peer from the main one
+            peer = _chat_peers.get(event.chat_id)
+            if peer is None:
+                peer = await client.get_input_entity(event.chat_id) if conn is not client else event.chat_id
+            result = await conn(GetBotCallbackAnswerRequest(
+                peer=peer,
+                msg_id=event.message.id,
+                data=step.btn.data if step.btn.data else None
+            ))
+            answer = getattr(result, "message", None)
+    except Exception as e:
+        error = e
+    finally:
+        _claims_in_flight -= 1
+    acked = time.perf_counter()
+    metrics.observe("claim_rpc", (link, CLAIM_TYPES[step.action]), int((acked - sent) * 1e6))
+    return error, sent, acked, answer
+
+
+def log_steps(steps: list[ButtonStep]):
+    """Log the per-button analysis and update detection stats.
+
+    Hot path: uses lazy %-formatting and level checks, so disabled levels
+    cost nothing.
+    """
+    debug = logger.isEnabledFor(logging.DEBUG)
+    info = logger.isEnabledFor(logging.INFO)
+    for step in steps:
+        btn = step.btn
+        if debug:
+            btn_type = "URL" if btn.url else ("CALLBACK" if btn.data else "OTHER")
+            logger.debug("   [%d:%d] %s: '%s'", step.row, step.col, btn_type, btn.text or "[Без текста]")
+
+        if step.action == STEP_BLACKLIST:
+            for word in step.verdict.blocked:
+                rule_hits.record("blacklist", word)
+            if debug:
+                logger.debug("   ⛔ Пропуск (blacklist: %s)", list(step.verdict.blocked))
+            continue
+
+        for word in step.verdict.triggers:
+            rule_hits.record("whitelist", word)
+        if step.url_verdict:
+            rule_hits.record(URL_KIND_LISTS[step.url_verdict.kind], step.url_verdict.rule)
+        if step.code_verdict and step.code_verdict.prefix:
+            rule_hits.record(CODE_KIND_LISTS[step.code_verdict.kind], step.code_verdict.prefix)
+
+        if step.verdict.is_gift_text:
+            stats.gifts_detected += 1
+            if info:
+                logger.info("   ✨ СОВПАДЕНИЕ! Триггеры: %s", list(step.verdict.triggers))
+
+        if step.url_verdict and info:
+            logger.info("🎰 РОЗЫГРЫШ: %s — участвуем!", step.url_verdict.reason)
+
+        if step.action == STEP_CALLBACK:
+            if info:
+                logger.info("🎯 CALLBACK кнопка: '%s'", btn.text or "[Без текста]")
+        elif step.action == STEP_SKIP_CODE:
+            stats.codes_skipped += 1
+            if info:
+                logger.info("⏭️ ПРОПУСК: код '%s' — %s", step.start_param[:25], step.code_verdict.reason)
+        elif step.start_param:
+            stats.gifts_detected += 1
+            if info:
+                if step.code_verdict.is_giveaway:
+                    logger.info("🎰 Код розыгрыша: %s", step.start_param)
+                else:
+                    logger.info("🔗 URL кнопка с кодом: %s", step.start_param)
+                logger.info("   📋 Анализ: %s", step.code_verdict.reason)
+
+            if step.action == STEP_NO_BOT:
+                if debug:
+                    logger.debug("   URL без бота: %s", btn.url[:50])
+            elif step.action == STEP_GIVEAWAY:
+                logger.info("🎰 Нажимаю кнопку розыгрыша")
+            else:
+                logger.info("🎯 Отправляю /start @%s", step.target_bot)
+
+
+# Already claimed targets: (bot, code) for /start and giveaway buttons,
+# (chat, msg, data) for callback presses
+dedup = DedupCache(DEDUP_SIZE, DEDUP_TTL)
+
+def claim_key(chat_id, msg_id, step: ButtonStep) -> tuple:
+    """Dedup key of a planned claim."""
+    if step.action in (STEP_START, STEP_GIVEAWAY):
+        return ("start", step.target_bot, step.start_param)
+    data = step.btn.data.hex() if step.btn.data else ""
+    return ("press", str(chat_id), str(msg_id), data)
+
+# Claim type label per step action
+CLAIM_TYPES = {STEP_CALLBACK: "callback", STEP_START: "start", STEP_GIVEAWAY: "giveaway"}
+
+async def smart_claim(client, event, received: Optional[float] = None, buttons=None):
+    """Detect and claim gifts from message buttons and check links in the text.
+
+    Every button is classified first, then all claimable ones are sent at
+    once; logging, stats and notifications for each outcome happen
+    afterwards. Links from the text and hidden-link entities are added as
+    one more row of button-like TextLinks. `received` is the perf_counter
+    time the update arrived; `buttons` limits the claim to these rows
+    (e.g. only buttons changed by an edit). Returns True if at least one
+    claim was sent.
+    """
+    message = event.message
+    claim_start = received or time.perf_counter()
+    rows = message.buttons if buttons is None else buttons
+    text_links = None
+    if buttons is None:
+        text_links = extract_links(message.raw_text, message.entities, rows)
+        if text_links:
+            rows = (rows or []) + [text_links]
+    
+    if not rows:
+        return False
+    
+    steps = plan_buttons(rows)
+    classified = time.perf_counter()
+    claims = []
+    duplicates = []
+    for step in steps:
+        if step.action not in CLAIM_STEPS:
+            continue
+        if dedup.seen(claim_key(event.chat_id, message.id, step)):
+            duplicates.append(step)
+        else:
+            claims.append(step)
+    
+    if claims:
+        results = await asyncio.gather(*(send_claim(client, event, step) for step in claims))
+        for step, (error, sent, acked, _) in zip(claims, results):
+            if error is not None:
+                # Marked before sending so a repeat in flight is skipped;
+                # a failed claim must stay retryable (edits, catch-up)
+                dedup.forget(claim_key(event.chat_id, message.id, step))
+            observe_claim(event.chat_id, step.target_bot or "", CLAIM_TYPES[step.action],
+                          claim_start, classified, sent, acked)
+    else:
+        results = ()
+        observe_claim(event.chat_id, "", "none", claim_start, classified)
+
+    if buttons is None and message.buttons:
+        stats.messages_with_buttons += 1
+    if text_links:
+        stats.messages_with_text_links += 1
+    if logger.isEnabledFor(logging.INFO):
+        if message.buttons or buttons:
+            logger.info("🔘 Сообщение с кнопками! Найдено кнопок: %d",
+                        sum(len(row) for row in rows) - len(text_links or ()))
+        if text_links:
+            logger.info("🔗 Ссылки с кодом в тексте: %d", len(text_links))
+    log_steps([step for step in steps if step not in duplicates] if duplicates else steps)
+    for step in duplicates:
+        stats.duplicates_skipped += 1
+        logger.info("🔁 ПОВТОР: %s уже отправлялся — пропуск",
+                    step.start_param or step.btn.text or "[Без текста]")
+    if len(claims) > 1:
+        stats.multi_claim_messages += 1
+        logger.info("🎯 Отправлено клеймов одновременно: %d", len(claims))
+
+    for step, (error, sent, acked, answer) in zip(claims, results):
+        record_claim(client, step, error, int((acked - claim_start) * 1000), sent, answer, acked)
+    return bool(claims)
+
+def record_claim(client, step: ButtonStep, error: Optional[Exception], elapsed: int,
+                 sent: Optional[float] = None, answer: Optional[str] = None,
+                 acked: Optional[float] = None):
+    """Log, count and notify the outcome of one claim, and hand it to the
+    confirmation tracker (the RPC succeeding does not mean we won).
+    Confirmation times run from sent, like claim_confirm documents."""
+    if step.target_bot and step.target_bot not in _peers:
+        learn_bot(client, step.target_bot)
+
+    if step.action == STEP_CALLBACK:
+        bot, code = "callback", step.btn.text or "[Без текста]"
+    else:
+        bot, code = step.target_bot, step.start_param
+    claim_type = CLAIM_TYPES[step.action]
+
+    if error is None:
+        if step.action == STEP_CALLBACK:
+            logger.info("✅ УСПЕХ! Callback нажат за %dms", elapsed)
+        elif step.action == STEP_GIVEAWAY:
+            logger.info("✅ УСПЕХ! Кнопка розыгрыша нажата за %dms", elapsed)
+        else:
+            logger.info("✅ УСПЕХ! /start отправлен за %dms", elapsed)
+        stats.gifts_claimed += 1
+        stats.claim_results[(claim_type, "ok")] += 1
+        stats.last_gift_time = datetime.now()
+        notify_gift(bot, code, elapsed, True, step.code_verdict)
+        if step.action == STEP_START:
+            peer = _peers.get(step.target_bot)
+            confirmations.expect(getattr(peer, "user_id", None) or step.target_bot,
+                                 bot, code, claim_type, sent or time.perf_counter())
+        else:
+            # The callback answer is the confirmation: sent -> acked
+            now = time.perf_counter()
+            confirmations.resolve(claim_type, bot, code, answer, (acked or now) - (sent or now))
+    else:
+        if step.action == STEP_CALLBACK:
+            logger.warning("⚠️ Ошибка callback (попытка засчитана): %s", error)
+        elif step.action == STEP_GIVEAWAY:
+            logger.error("❌ ОШИБКА нажатия кнопки: %s", error)
+        elif isinstance(error, FloodWaitError):
+            logger.error("🚫 FLOOD WAIT: %ss", error.seconds)
+        else:
+            logger.error("❌ ОШИБКА отправки /start: %s", error)
+        stats.gifts_failed += 1
+        stats.claim_results[(claim_type, "error")] += 1
+        notify_gift(bot, code, 0, False, step.code_verdict)
+
+# Human-readable claim outcomes
+OUTCOME_LABELS = {
+    "won": "🏆 получено", "already_claimed": "🥈 уже забрали", "expired": "⌛ истек",
+    "unknown": "❔ ответ не распознан", "no_reply": "🔇 без ответа",
+}
+
+def on_confirmation(result: ClaimResult):
+    """Log and measure a claim outcome reported by the bot."""
+    label = OUTCOME_LABELS.get(result.outcome, result.outcome)
+    if result.seconds is None:
+        logger.info("📭 Клейм @%s %s: %s за %ds", result.bot, result.code, label, int(CONFIRM_WINDOW))
+        return
+    metrics.observe("claim_confirm", (result.claim_type, result.outcome), int(result.seconds * 1e6))
+    logger.info("📬 Клейм @%s %s: %s (подтверждение за %dms)",
+                result.bot, result.code, label, int(result.seconds * 1000))
+
+# Sent claims waiting for the bot's verdict
+confirmations = ConfirmationTracker(CONFIRM_WINDOW, on_result=on_confirmation)
 
 # ============================================================================
 # MESSAGE HANDLER (PARALLEL PROCESSING)
 # ============================================================================
-async def process_message(client, event):
-    """Process a single message (runs in parallel)."""
+# Chat id -> short title, filled at startup so the hot path never waits
+# for get_chat()
+_chat_titles: dict[int, str] = {}
+
+def chat_title_of(chat) -> str:
+    """Short display name for a chat entity."""
+    if getattr(chat, 'title', None):
+        return chat.title[:30]
+    if getattr(chat, 'username', None):
+        return f"@{chat.username}"
+    return "Unknown"
+
+# get_entity() requests per batch when resolving channels
+CHANNEL_BATCH = 100
+
+def configured_channels() -> list:
+    """TARGET_CHANNELS followed by CHANNELS_FILE entries, without repeats."""
+    return list(dict.fromkeys(TARGET_CHANNELS + _file_channels))
+
+def set_monitored(entries) -> tuple[int, int]:
+    """Swap in the channel set for entries. Returns (added, removed)."""
+    global monitored
+    peer_ids = []
+    for ch in entries:
+        peer_id = _channel_keys.get(str(ch))
+        if peer_id is None and isinstance(ch, int):
+            peer_id = ch  # A peer id is enough to match updates
+        if peer_id is not None:
+            peer_ids.append(peer_id)
+    new = ChannelSet(peer_ids)
+    added, removed = monitored.diff(new)
+    monitored = new
+    return added, removed
+
+async def load_chat_titles(client, refresh: bool = False) -> tuple[int, int]:
+    """Resolve configured channels in concurrent batches, remember their
+    titles and peers, and swap in the new monitored set."""
+    entries = configured_channels()
+    pending = [ch for ch in entries if refresh or str(ch) not in _channel_keys]
+    batches = [pending[i:i + CHANNEL_BATCH] for i in range(0, len(pending), CHANNEL_BATCH)]
+    
+    async def resolve(i, batch):
+        try:
+            entities = await client.get_entity(batch)
+        except Exception:
+            # One bad entry fails the whole batch: retry one by one
+            entities = []
+            for ch in batch:
+                try:
+                    entities.append(await client.get_entity(ch))
+                except Exception as e:
+                    logger.warning(f"⚠️ Канал {ch} не найден: {e}")
+                    entities.append(None)
+        for ch, entity in zip(batch, entities):
+            if entity is None:
+                continue
+            peer_id = utils.get_peer_id(entity)
+            _channel_keys[str(ch)] = peer_id
+            _chat_titles[peer_id] = chat_title_of(entity)
+            _chat_peers[peer_id] = utils.get_input_peer(entity)
+    
+    await _gather_limited(batches, resolve)
+    changes = set_monitored(entries)
+    logger.info(f"📡 Каналы загружены: {len(monitored)}/{len(entries)} "
+                f"(память ~{monitored.memory_bytes() // 1024} KB)")
+    return changes
+
+async def watch_channels_file():
+    """Re-read CHANNELS_FILE when it changes and update the monitored set."""
+    global _file_channels
+    mtime = os.stat(CHANNELS_FILE).st_mtime if os.path.exists(CHANNELS_FILE) else None
+    while True:
+        await asyncio.sleep(CHANNELS_POLL_INTERVAL)
+        try:
+            current = os.stat(CHANNELS_FILE).st_mtime
+        except OSError:
+            continue
+        if current == mtime:
+            continue
+        mtime = current
+        try:
+            _file_channels = read_channels_file(CHANNELS_FILE)
+        except Exception as e:
+            logger.error(f"❌ {CHANNELS_FILE} не прочитан: {e} — оставляю старый список")
+            continue
+        if _client is not None and _client.is_connected():
+            added, removed = await load_chat_titles(_client)
+            save_entity_snapshot()
+        else:
+            added, removed = set_monitored(configured_channels())
+        logger.info(f"📡 Список каналов обновлен: +{added} / -{removed}, всего {len(monitored)}")
+
+async def process_message(client, event, received: Optional[float] = None):
+    """Process a single message (runs in parallel).
+
+    Claims first; chat lookup, logging and stats only after the claim RPC.
+    """
+    receive_time = received or time.perf_counter()
+    message = event.message
+    # Before the claim awaits: an edit handled meanwhile must find this
+    # keyboard and keep its own fingerprint afterwards
+    markup.remember(event.chat_id, message.id, message.buttons)
+    
+    # Try to claim
+    was_gift = await smart_claim(client, event, receive_time)
+    claim_done = time.perf_counter()
+    
     stats.messages_total += 1
     stats.last_message_time = datetime.now()
-    receive_time = time.time()
     
-    # Get chat info
-    chat_title = "Unknown"
     chat_id = event.chat_id
-    try:
-        chat = await event.get_chat()
-        if hasattr(chat, 'title'):
-            chat_title = chat.title[:30]
-        elif hasattr(chat, 'username'):
-            chat_title = f"@{chat.username}"
-    except Exception:
-        pass
+    if message.id > _last_seen.get(chat_id, 0):
+        _last_seen[chat_id] = message.id
     
-    message = event.message
-    has_buttons = bool(message.buttons)
-    text_preview = (message.text or "")[:50].replace('\n', ' ')
-    if not text_preview and message.media:
-        text_preview = "[Медиа]"
+    # Get chat info (cached; get_chat only for chats unknown at startup)
+    chat_title = _chat_titles.get(chat_id)
+    if chat_title is None:
+        chat_title = "Unknown"
+        try:
+            chat_title = chat_title_of(await event.get_chat())
+            _chat_titles[chat_id] = chat_title
+        except Exception:
+            pass
     
     # Log incoming message with more details
-    btn_count = sum(len(r) for r in message.buttons) if message.buttons else 0
-    btn_info = f" [🔘 {btn_count}]" if has_buttons else ""
-    logger.info(f"📨 #{stats.messages_total} | {chat_title} ({chat_id}){btn_info}")
-    if text_preview:
-        logger.debug(f"   📝 Текст: {text_preview}...")
+    if logger.isEnabledFor(logging.INFO):
+        btn_count = sum(len(r) for r in message.buttons) if message.buttons else 0
+        btn_info = f" [🔘 {btn_count}]" if btn_count else ""
+        logger.info("📨 #%d | %s (%s)%s", stats.messages_total, chat_title, chat_id, btn_info)
+    if logger.isEnabledFor(logging.DEBUG):
+        text_preview = (message.text or "")[:50].replace('\n', ' ')
+        if not text_preview and message.media:
+            text_preview = "[Медиа]"
+        if text_preview:
+            logger.debug("   📝 Текст: %s...", text_preview)
     
-    # Try to claim
-    claim_start = time.time()
-    was_gift = await smart_claim(client, event)
+    if _capture:
+        _capture.write(chat_id, message)
+    
+    if was_gift:
+        claim_elapsed = int((claim_done - receive_time) * 1000)
+        total_elapsed = int((time.perf_counter() - receive_time) * 1000)
+        logger.info("🎁 ПОДАРОК ОБРАБОТАН! Общее: %dms | Обработка: %dms", total_elapsed, claim_elapsed)
+        log_stats()
+
+# Chat id -> id of the newest message processed, to know what to catch up on
+_last_seen: dict[int, int] = {}
+
+class HistoryEvent:
+    """NewMessage-like wrapper for a message fetched with get_messages()."""
+    __slots__ = ("message", "chat_id")
+    
+    def __init__(self, message):
+        self.message = message
+        self.chat_id = message.chat_id
+    
+    async def get_chat(self):
+        return await self.message.get_chat()
+
+async def catch_up(client):
+    """Fetch posts missed while disconnected and claim the ones with buttons.
+
+    All channels are fetched concurrently; claims start newest first, since
+    older checks are the most likely to be used up already.
+    """
+    if CATCHUP_LIMIT <= 0 or not _last_seen:
+        return
+    started = time.perf_counter()
+    missed = []
+    
+    async def fetch(i, chat_id):
+        last_id = _last_seen[chat_id]
+        try:
+            messages = await client.get_messages(_chat_peers.get(chat_id) or chat_id,
+                                                 min_id=last_id, limit=CATCHUP_LIMIT)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось догнать канал {chat_id}: {e}")
+            return
+        if len(messages) >= CATCHUP_LIMIT:
+            logger.warning(f"⚠️ {_chat_titles.get(chat_id, chat_id)}: пропущено больше "
+                           f"{CATCHUP_LIMIT} постов, старые не проверены")
+        for message in messages:
+            if message.reply_markup is not None:
+                missed.append(message)
+            elif message.id > _last_seen.get(chat_id, 0):
+                _last_seen[chat_id] = message.id
+    
+    await _gather_limited([chat_id for chat_id in _last_seen if chat_id in monitored], fetch)
+    if not missed:
+        logger.info(f"📥 Пропущенных постов с кнопками нет ({int((time.perf_counter() - started) * 1000)}ms)")
+        return
     
+    missed.sort(key=lambda m: (m.date, m.id), reverse=True)
+    logger.info(f"📥 Догоняю пропущенное: {len(missed)} постов с кнопками")
+    stats.catchup_messages += len(missed)
+    # Tasks run in creation order, so claim RPCs go out newest first
+    received = time.perf_counter()
+    await asyncio.gather(*(process_message(client, HistoryEvent(m), received) for m in missed))
+
+# Button fingerprints of recent messages, to diff edits against
+markup = MarkupTracker(EDIT_TRACK_SIZE)
+
+async def process_edit(client, event, received: Optional[float] = None):
+    """Process an edited message: claim only buttons that are new or changed.
+
+    Text-only edits cost a single fingerprint compare.
+    """
+    received = received or time.perf_counter()
+    message = event.message
+    stats.edits_total += 1
+    
+    new_rows = markup.diff(event.chat_id, message.id, message.buttons)
+    if not new_rows:
+        return
+    
+    was_gift = await smart_claim(client, event, received, buttons=new_rows)
+    
+    stats.edits_with_new_buttons += 1
+    chat_title = _chat_titles.get(event.chat_id, "Unknown")
+    logger.info("✏️ Правка | %s (%s) | новых кнопок: %d",
+                chat_title, event.chat_id, sum(len(row) for row in new_rows))
     if was_gift:
-        total_elapsed = int((time.time() - receive_time) * 1000)
-        claim_elapsed = int((time.time() - claim_start) * 1000)
-        logger.info(f"🎁 ПОДАРОК ОБРАБОТАН! Общее: {total_elapsed}ms | Обработка: {claim_elapsed}ms")
+        logger.info("🎁 ПОДАРОК ИЗ ПРАВКИ! Общее: %dms", int((time.perf_counter() - received) * 1000))
         log_stats()
 
+# Worker pool for updates (created in main)
+_scheduler: Optional[Scheduler] = None
+
+def markup_priority(rows) -> Optional[int]:
+    """Cheap guess at how urgent a keyboard is; None if there is none."""
+    if not rows:
+        return None
+    for row in rows:
+        for btn in row:
+            if btn.data or (btn.url and "start" in btn.url):
+                return PRIORITY_CLAIM
+    return PRIORITY_BUTTONS
+
+async def dispatch_message(client, event, received: float):
+    """Queue a new message for the workers by how claimable it looks."""
+    message = event.message
+    priority = markup_priority(message.buttons)
+    if priority is None and has_links(message.raw_text, message.entities):
+        priority = PRIORITY_CLAIM  # Check link in the text
+    if priority is None:
+        _scheduler.submit_cheap(process_message, client, event, received)
+    else:
+        await _scheduler.submit(priority, process_message, client, event, received)
+
+def count_plain_post(chat_id: int, message):
+    """Everything the claimer needs from a post without buttons."""
+    stats.messages_total += 1
+    stats.raw_skipped += 1
+    stats.last_message_time = datetime.now()
+    if message.id > _last_seen.get(chat_id, 0):
+        _last_seen[chat_id] = message.id
+
+def build_message_event(client, update):
+    """NewMessage event for a raw update, set up like Telethon's dispatcher does."""
+    event = events.NewMessage.Event(update.message)
+    event.original_update = update
+    event._entities = getattr(update, "_entities", {})
+    event._set_client(client)
+    return event
+
+def reply_username(update, user_id: int) -> Optional[str]:
+    """Username of a private chat: from the update's entities when it has
+    them (short updates do not), else from the bot peer cache."""
+    sender = getattr(update, "_entities", {}).get(user_id)
+    if sender is not None:
+        return getattr(sender, "username", None)
+    for name, peer in _peers.items():
+        if getattr(peer, "user_id", None) == user_id:
+            return name
+    return None
+
 def setup_handlers(client):
-    """Setup message event handlers with parallel processing."""
+    """Setup message event handlers feeding the worker pool."""
+    
+    if RAW_PREFILTER:
+        @client.on(events.Raw(types.UpdateNewChannelMessage))
+        async def raw_handler(update):
+            received = time.perf_counter()
+            message = update.message
+            if type(message) is not types.Message:
+                return
+            chat_id = monitored.bare.get(message.peer_id.channel_id)
+            if chat_id is None:
+                return
+            activity.record(chat_id, received)
+            # No keyboard and no link: no event object, no chat lookup, no task
+            if message.reply_markup is None and not _capture and not has_links(message.message, message.entities):
+                count_plain_post(chat_id, message)
+                return
+            await dispatch_message(client, build_message_event(client, update), received)
+        
+        # Basic groups (PeerChat) never come as channel updates
+        @client.on(events.Raw((types.UpdateNewMessage, types.UpdateShortChatMessage)))
+        async def group_handler(update):
+            if not monitored.chats:
+                return
+            if type(update) is types.UpdateShortChatMessage:
+                chat_id = monitored.chats.get(update.chat_id)
+            else:
+                peer = getattr(update.message, "peer_id", None)
+                chat_id = monitored.chats.get(peer.chat_id) if type(peer) is types.PeerChat else None
+            if chat_id is None:
+                return
+            received = time.perf_counter()
+            # Telethon's own conversion, short form included
+            event = events.NewMessage.build(update, None, getattr(client, "_self_id", None))
+            if event is None:
+                return
+            event.original_update = update
+            event._entities = getattr(update, "_entities", {})
+            event._set_client(client)
+            activity.record(chat_id, received)
+            await dispatch_message(client, event, received)
+    else:
+        @client.on(events.NewMessage(func=lambda e: e.chat_id in monitored.ids))
+        async def handler(event):
+            received = time.perf_counter()
+            activity.record(event.chat_id, received)
+            await dispatch_message(client, event, received)
+    
+    # Bot replies to /start claims say whether we actually won. Raw, so
+    # channel posts never build a NewMessage event just to be filtered out.
+    # Plain-text private replies often come as UpdateShortMessage, which
+    # Telethon hands to raw handlers as is
+    @client.on(events.Raw((types.UpdateNewMessage, types.UpdateShortMessage)))
+    async def reply_handler(update):
+        if type(update) is types.UpdateShortMessage:
+            if update.out:
+                return
+            chat_id, text = update.user_id, update.message
+        else:
+            message = update.message
+            if type(message) is not types.Message or message.out or type(message.peer_id) is not types.PeerUser:
+                return
+            chat_id, text = message.peer_id.user_id, message.message
+        if not confirmations.wants(chat_id):
+            return
+        confirmations.on_reply(chat_id, reply_username(update, chat_id), text, time.perf_counter())
     
-    @client.on(events.NewMessage(chats=TARGET_CHANNELS))
-    async def handler(event):
-        # Process in parallel - don't block other messages
-        asyncio.create_task(process_message(client, event))
+    # Keyboards are often added or swapped by a later edit
+    @client.on(events.MessageEdited(func=lambda e: e.chat_id in monitored.ids))
+    async def edit_handler(event):
+        received = time.perf_counter()
+        activity.record(event.chat_id, received)
+        priority = markup_priority(event.message.buttons)
+        if priority is None:
+            _scheduler.submit_cheap(process_edit, client, event, received)
+        else:
+            await _scheduler.submit(priority, process_edit, client, event, received)
 
 def log_stats():
     """Log current statistics."""
@@ -514,10 +1435,39 @@ def log_stats():
     logger.info(f"   📨 Сообщений: {stats.messages_total} | С кнопками: {stats.messages_with_buttons}")
     logger.info(f"   🎁 Подарков: {stats.gifts_detected} | Пропущено: {stats.codes_skipped}")
     logger.info(f"   ✅ Успешно: {stats.gifts_claimed} | ❌ Ошибок: {stats.gifts_failed}")
+    if stats.claim_results:
+        by_type = ", ".join(f"{claim_type} {result}: {count}"
+                            for (claim_type, result), count in sorted(stats.claim_results.items()))
+        logger.info(f"   🎯 По типам: {by_type}" +
+                    (f" | Несколько в одном сообщении: {stats.multi_claim_messages}" if stats.multi_claim_messages else ""))
     
     if stats.gifts_detected > 0:
         success_rate = (stats.gifts_claimed / stats.gifts_detected) * 100
-        logger.info(f"   📈 Успешность: {success_rate:.1f}%")
+        logger.info(f"   📈 Успешность: {success_rate:.1f}% (отправлено)")
+    
+    outcomes = confirmations.outcomes()
+    if outcomes:
+        decided = sum(outcomes.values())
+        logger.info("   🏆 Подтверждено ботами: " + " | ".join(
+            f"{OUTCOME_LABELS.get(outcome, outcome)}: {count}" for outcome, count in outcomes.most_common()) +
+            f" — выиграно {outcomes[OUTCOME_WON] / decided * 100:.1f}%")
+        confirmed = metrics.merged("claim_confirm", outcome=OUTCOME_WON)
+        if confirmed.count:
+            logger.info(f"   ⏱ До подтверждения p50/p99: {confirmed.percentile(50) / 1000:.0f}/"
+                        f"{confirmed.percentile(99) / 1000:.0f}ms")
+    
+    acked = metrics.merged("claim_stage", stage="acked")
+    if acked.count:
+        logger.info(f"   ⏱ Клейм p50/p99: {acked.percentile(50) / 1000:.1f}/{acked.percentile(99) / 1000:.1f}ms")
+    
+    for link in (LINK_DEDICATED, LINK_SHARED):
+        rpc = metrics.merged("claim_rpc", link=link)
+        if rpc.count:
+            logger.info(f"   🔌 RPC клейма ({link}) p50/p99: {rpc.percentile(50) / 1000:.1f}/{rpc.percentile(99) / 1000:.1f}ms")
+    
+    waited = metrics.merged("queue_wait", lane="main")
+    if waited.count:
+        logger.info(f"   🧵 Ожидание воркера p50/p99: {waited.percentile(50) / 1000:.1f}/{waited.percentile(99) / 1000:.1f}ms")
     
     if stats.messages_total > 0:
         button_rate = (stats.messages_with_buttons / stats.messages_total) * 100
@@ -533,8 +1483,18 @@ def log_stats():
             time_str = f"{time_ago//3600}h назад"
         logger.info(f"   ⏰ Последний подарок: {time_str}")
     
+    if stats.edits_total > 0:
+        logger.info(f"   ✏️ Правок: {stats.edits_total} | С новыми кнопками: {stats.edits_with_new_buttons}")
+    
+    if stats.duplicates_skipped > 0:
+        logger.info(f"   🔁 Повторов пропущено: {stats.duplicates_skipped} (hit rate {dedup.hit_rate() * 100:.1f}%)")
+    
     if stats.restarts > 0:
         logger.info(f"   🔄 Перезапусков: {stats.restarts}")
+        if stats.last_reconnect_ms is not None:
+            logger.info(f"   ⚡ Последнее переподключение: {stats.last_reconnect_ms}ms")
+        if stats.catchup_messages > 0:
+            logger.info(f"   📥 Догнано после переподключений: {stats.catchup_messages}")
     
     logger.info("=" * 60)
 
@@ -569,9 +1529,11 @@ async def login_with_qr(client):
 
 async def login_system(client):
     """Handle authentication."""
+    global _me
     if await client.is_user_authorized():
-        me = await client.get_me()
-        logger.info(f"Logged in as: {me.first_name} (@{me.username})")
+        if _me is None:
+            _me = await client.get_me()
+            logger.info(f"Logged in as: {_me.first_name} (@{_me.username})")
         return True
 
     # If using StringSession, it should already be authorized
@@ -586,68 +1548,245 @@ async def login_system(client):
 # ============================================================================
 # MAIN WITH AUTO-RESTART
 # ============================================================================
+# perf_counter time the last run ended with an error (None on first start)
+_disconnected_at: Optional[float] = None
+# Whether the last run_client got as far as monitoring
+_last_run_ready = False
+# Set when the watchdog dropped the connection on purpose
+_forced_reconnect = False
+
+# Update arrival per channel, for the stall watchdog
+activity = ActivityModel()
+_watchdog: Optional[Watchdog] = None
+
+def is_monitoring() -> bool:
+    return _last_run_ready and _client is not None and _client.is_connected()
+
+# Newest posts fetched by the stall probe (service posts are skipped)
+PROBE_MESSAGES = 10
+
+async def probe_updates() -> tuple[bool, str]:
+    """Cheap check whether silence is real: ask the most active channel for
+    its newest post and compare with the newest one we processed."""
+    client = _client
+    chat_id = activity.most_active()
+    if chat_id is None:
+        await client(GetStateRequest())
+        return True, "GetState ответил"
+    # Service posts (pins, joins, photo changes) never reach the handlers:
+    # compare only the newest regular post
+    messages = await client.get_messages(_chat_peers.get(chat_id) or chat_id, limit=PROBE_MESSAGES)
+    newest = next((m.id for m in messages if type(m) is types.Message), 0)
+    seen = _last_seen.get(chat_id, 0)
+    if newest > seen:
+        return False, f"в {_chat_titles.get(chat_id, chat_id)} есть пост #{newest}, получен только #{seen}"
+    return True, f"в {_chat_titles.get(chat_id, chat_id)} новых постов нет"
+
+def force_reconnect(reason: str):
+    """Drop the connection; run_client reports it and the loop reconnects."""
+    global _forced_reconnect, _disconnected_at
+    if _client is None or not _client.is_connected():
+        return
+    logger.warning(f"🐕 Апдейты не приходят ({reason}) — переподключаюсь")
+    notify(f"🐕 Зависание апдейтов: {reason}. Переподключаюсь.", silent=True)
+    _forced_reconnect = True
+    _disconnected_at = time.perf_counter()
+    asyncio.create_task(_client.disconnect())
+
+def health_status() -> dict:
+    status = _watchdog.status() if _watchdog else {"alive": True}
+    status["ready"] = status["alive"] and is_monitoring()
+    status["restarts"] = stats.restarts
+    return status
+
+def render_healthz() -> tuple[int, str, str]:
+    """Liveness: the event loop still runs the watchdog."""
+    status = health_status()
+    return (200 if status["alive"] else 503), "application/json", json.dumps(status) + "\n"
+
+def render_readyz() -> tuple[int, str, str]:
+    """Readiness: connected, logged in and monitoring."""
+    status = health_status()
+    return (200 if status["ready"] else 503), "application/json", json.dumps(status) + "\n"
+
+# Loop profiler (created in main, idle until PROFILE=1 or SIGUSR2)
+_profiler: Optional[LoopProfiler] = None
+
+def start_profiler():
+    _profiler.start()
+    logger.info(f"🔬 Профилирование включено (каждые {PROFILE_INTERVAL_MS:g}ms), "
+                f"повторный SIGUSR2 — остановить и записать")
+
+def stop_profiler():
+    """Stop sampling, write the files and log where the loop spent its time."""
+    paths = _profiler.stop()
+    if not paths:
+        return
+    elapsed = time.perf_counter() - _profiler.started_at
+    lags = sorted(lag for _, lag in _profiler.lag)
+    worst = lags[-1] * 1000 if lags else 0.0
+    logger.info(f"🔬 Профиль: {_profiler.samples} сэмплов за {elapsed:.0f}s, "
+                f"накладные {_profiler.overhead / elapsed * 100:.1f}%, макс. задержка loop {worst:.1f}ms")
+    for label, share in _profiler.top():
+        logger.info(f"   {share * 100:5.1f}%  {label}")
+    logger.info(f"🔬 Файлы: {', '.join(paths)}")
+
+def toggle_profiler():
+    try:
+        stop_profiler() if _profiler.running else start_profiler()
+    except Exception as e:
+        logger.error(f"❌ Профилирование: {e}")
+
+async def start_claim_link(client):
+    try:
+        await _claim_link.start(client)
+    except Exception as e:
+        logger.warning(f"⚠️ Канал клеймов не подключен, клеймы идут через основное соединение до переподключения: {e}")
+
+def reconnect_delay(attempt: int) -> float:
+    """Jittered exponential backoff: base * 2^attempt, capped, 50-100%."""
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+# Background refresh of snapshot entries (runs once per process)
+_refresh_task: Optional[asyncio.Task] = None
+
+async def refresh_entities(client):
+    """Re-resolve all bots and channels and rewrite the snapshot."""
+    try:
+        await load_chat_titles(client, refresh=True)
+        await preload_bots(client, refresh=True)
+        save_entity_snapshot()
+    except Exception as e:
+        logger.warning(f"⚠️ Обновление кэша не удалось: {e}")
+
+def announce_start():
+    """Log the banner and send the startup notification (first run only)."""
+    stats.start_time = time.time()
+    logger.info("")
+    logger.info("🚀 МОНИТОРИНГ ЗАПУЩЕН!")
+    logger.info("   Ожидаю сообщения в каналах...")
+    logger.info("   Уведомления: Saved Messages")
+    logger.info("")
+    
+    entries = configured_channels()
+    channels_list = "\n".join([f"• {ch}" for ch in entries[:5]])
+    if len(entries) > 5:
+        channels_list += f"\n... и еще {len(entries)-5}"
+    
+    bots_list = "\n".join([f"• @{bot}" for bot in PRELOAD_BOTS[:5]])
+    if len(PRELOAD_BOTS) > 5:
+        bots_list += f"\n... и еще {len(PRELOAD_BOTS)-5}"
+    
+    notify(f"""🚀 **Gift Claimer запущен!**
+
+📡 **Каналы ({len(monitored)}/{len(entries)}):**
+{channels_list}
+
+🤖 **Боты для предзагрузки ({len(PRELOAD_BOTS)}):**
+{bots_list}
+
+✅ Загружено: {stats.preloaded_bots}/{len(PRELOAD_BOTS)}""", silent=True)
+
 async def run_client():
-    """Run the client once. Returns True if should restart."""
-    global _client
+    """Run the client once. Returns True if should restart.
+
+    In fast reconnect mode the client object (with its entity cache,
+    handlers and authorization) is reused between runs.
+    """
+    global _client, _refresh_task, _disconnected_at, _last_run_ready, _forced_reconnect
+    _last_run_ready = False
     
-    client = create_client()
-    _client = client  # Set global for notifications
-    setup_handlers(client)
+    phases = PhaseTimer()
+    loaded = 0
+    if not _peers and not _chat_peers:
+        loaded = load_entity_snapshot()
+        if loaded:
+            logger.info(f"💾 Загружено из снимка: {loaded} записей")
+    phases.mark("snapshot")
+    
+    if RECONNECT_MODE == "fast" and _client is not None:
+        client = _client
+    else:
+        client = create_client()
+        _client = client  # Set global for notifications
+        setup_handlers(client)
     
     try:
         await client.connect()
+        phases.mark("connect")
         
         if not await login_system(client):
             logger.error("❌ Login failed!")
             return False  # Don't restart on auth failure
+        check_snapshot_owner()
+        if _session_flusher:
+            # Persist a fresh login right away, not at the next interval
+            await _session_flusher.flush()
+        phases.mark("login")
         
-        # Preload bots for faster claiming
-        await preload_bots(client)
+        # The claim connection comes up in the background; until then
+        # claims go over this client
+        if _claim_link and _claim_link.client is None:
+            asyncio.create_task(start_claim_link(client))
         
-        stats.start_time = time.time()
-        logger.info("")
-        logger.info("🚀 МОНИТОРИНГ ЗАПУЩЕН!")
-        logger.info("   Ожидаю сообщения в каналах...")
-        logger.info("   Уведомления: Saved Messages")
-        logger.info("")
+        # Resolve channels and preload bots missing from the cache
+        await load_chat_titles(client)
+        phases.mark("channels")
+        await preload_bots(client)
+        phases.mark("preload")
+        save_entity_snapshot()
         
-        # Send startup notification
-        channels_list = "\n".join([f"• {ch}" for ch in TARGET_CHANNELS[:5]])
-        if len(TARGET_CHANNELS) > 5:
-            channels_list += f"\n... и еще {len(TARGET_CHANNELS)-5}"
+        # Entries from the snapshot are refreshed once per process, in the
+        # background, so a stale access hash doesn't survive for long
+        if loaded and _refresh_task is None:
+            _refresh_task = asyncio.create_task(refresh_entities(client))
         
-        bots_list = "\n".join([f"• @{bot}" for bot in PRELOAD_BOTS[:5]])
-        if len(PRELOAD_BOTS) > 5:
-            bots_list += f"\n... и еще {len(PRELOAD_BOTS)-5}"
+        logger.info(f"⏱ Старт: {phases.summary()}")
+        _last_run_ready = True
+        if stats.start_time is None:
+            _disconnected_at = None  # Never was connected: not a reconnect
         
-        await notify(f"""🚀 **Gift Claimer запущен!**
-
-📡 **Каналы ({len(TARGET_CHANNELS)}):**
-{channels_list}
-
-🤖 **Боты для предзагрузки ({len(PRELOAD_BOTS)}):**
-{bots_list}
-
-✅ Загружено: {stats.preloaded_bots}/{len(PRELOAD_BOTS)}""", silent=True)
+        if stats.start_time is None:
+            announce_start()
+        elif _disconnected_at is not None:
+            reconnect_ms = int((time.perf_counter() - _disconnected_at) * 1000)
+            metrics.observe("reconnect", (), reconnect_ms * 1000)
+            stats.last_reconnect_ms = reconnect_ms
+            _disconnected_at = None
+            logger.info(f"⚡ Переподключено за {reconnect_ms}ms — мониторинг продолжается")
+            notify(f"🔄 Переподключено за {reconnect_ms}ms (перезапуск #{stats.restarts})", silent=True)
+            await catch_up(client)
         
         await client.run_until_disconnected()
+        if _forced_reconnect:
+            _forced_reconnect = False
+            return True  # Dropped by the watchdog: reconnect
         return False  # Normal disconnect
         
     except KeyboardInterrupt:
         logger.info("🛑 Остановка по запросу...")
         return False
     except Exception as e:
+        if _disconnected_at is None:
+            _disconnected_at = time.perf_counter()
         logger.error(f"💥 Ошибка: {e}")
         logger.error(traceback.format_exc())
         return True  # Should restart
     finally:
         log_stats()
+        if DEDUP_FILE:
+            dedup.save(DEDUP_FILE)
+        if _notifier and client.is_connected():
+            await _notifier.flush()
         if client.is_connected():
             await client.disconnect()
-        _client = None
+        if RECONNECT_MODE != "fast":
+            _client = None
 
 async def main():
     """Main entry point with auto-restart."""
+    global _capture, _notifier, _scheduler, _file_channels, _watchdog, _claim_link, _profiler
     print()
     logger.info("=" * 50)
     logger.info("🎁 Telegram Gift Claimer v10.0")
@@ -660,37 +1799,184 @@ async def main():
     logger.info("📋 КОНФИГУРАЦИЯ:")
     logger.info(f"   API_ID: {API_ID}")
     logger.info(f"   API_HASH: {API_HASH[:8]}...{API_HASH[-4:]}")
-    logger.info(f"   SESSION: {'StringSession' if STRING_SESSION else 'File'}")
+    if SESSION_BACKEND == "memory":
+        session_kind = f"Memory → {SESSION_SNAPSHOT}"
+    else:
+        session_kind = "StringSession" if STRING_SESSION else "File"
+    logger.info(f"   SESSION: {session_kind} | BACKEND: {SESSION_BACKEND}")
     logger.info(f"   DEFAULT_BOT: @{DEFAULT_GIFT_BOT}")
     logger.info(f"   NOTIFY: {NOTIFY_USER}")
-    logger.info(f"   MAX_RETRIES: {MAX_RETRIES}")
+    logger.info(f"   MAX_RETRIES: {MAX_RETRIES} | RECONNECT: {RECONNECT_MODE}")
+    logger.info(f"   WORKERS: {WORKERS} | QUEUE: {WORK_QUEUE_SIZE} | RAW_PREFILTER: {RAW_PREFILTER}")
+    logger.info(f"   CLAIM_CONNECTION: {'отдельное соединение' if CLAIM_CONNECTION else 'общее'}")
+    logger.info(f"   LOG_LEVEL: {LOG_LEVEL}" + (f" | JSON: {LOG_JSON_FILE}" if LOG_JSON_FILE else ""))
     logger.info("")
-    logger.info(f"📡 КАНАЛЫ ({len(TARGET_CHANNELS)}):")
-    for i, ch in enumerate(TARGET_CHANNELS, 1):
+    if CHANNELS_FILE:
+        try:
+            _file_channels = read_channels_file(CHANNELS_FILE)
+        except Exception as e:
+            logger.error(f"Config error: CHANNELS_FILE {CHANNELS_FILE}: {e}")
+            sys.exit(1)
+    entries = configured_channels()
+    logger.info(f"📡 КАНАЛЫ ({len(entries)})" + (f" | файл: {CHANNELS_FILE}" if CHANNELS_FILE else "") + ":")
+    for i, ch in enumerate(entries[:10], 1):
         logger.info(f"   {i}. {ch}")
+    if len(entries) > 10:
+        logger.info(f"   ... и еще {len(entries) - 10}")
     logger.info("")
     logger.info(f"🤖 PRELOAD BOTS ({len(PRELOAD_BOTS)}):")
     for i, bot in enumerate(PRELOAD_BOTS, 1):
         logger.info(f"   {i}. @{bot}")
-    logger.info(f"🔍 WHITELIST: {', '.join(WHITELIST[:5])}...")
-    logger.info(f"⛔ BLACKLIST: {', '.join(BLACKLIST[:5])}...")
+    if RULES_FILE:
+        try:
+            apply_rules(load_rules(RULES_FILE, DEFAULT_RULES))
+        except Exception as e:
+            logger.error(f"Config error: RULES_FILE {RULES_FILE}: {e}")
+            sys.exit(1)
+    logger.info(f"📜 ПРАВИЛА: {rules.source} ({len(rules)})")
+    logger.info(f"🔍 WHITELIST: {', '.join(rules.lists['whitelist'][:5])}...")
+    logger.info(f"⛔ BLACKLIST: {', '.join(rules.lists['blacklist'][:5])}...")
+    if CAPTURE_FILE:
+        _capture = CorpusWriter(CAPTURE_FILE)
+        logger.info(f"💾 CAPTURE: {CAPTURE_FILE}")
     logger.info("=" * 50)
     
+    _profiler = LoopProfiler(asyncio.get_running_loop(), PROFILE_DIR, PROFILE_INTERVAL_MS / 1000)
+    if hasattr(signal, "SIGUSR2"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, toggle_profiler)
+    if PROFILE:
+        start_profiler()
+    
+    if SESSION_BACKEND == "memory":
+        open_memory_session()
+    
+    if DEDUP_FILE:
+        loaded = dedup.load(DEDUP_FILE)
+        logger.info(f"🔁 DEDUP: {DEDUP_FILE} ({loaded} записей)")
+    
+    _notifier = Notifier(
+        _send_notification,
+        window=NOTIFY_WINDOW,
+        max_queue=NOTIFY_QUEUE_SIZE,
+        max_defer=NOTIFY_MAX_DEFER,
+        is_busy=lambda: _claims_in_flight > 0 or _client is None or not _client.is_connected(),
+    )
+    _notifier.start()
+    
+    _scheduler = Scheduler(
+        workers=WORKERS,
+        max_queue=WORK_QUEUE_SIZE,
+        cheap_queue=WORK_QUEUE_SIZE,
+        on_wait=lambda lane, wait_us: metrics.observe("queue_wait", (lane,), wait_us),
+    )
+    _scheduler.start()
+    
+    if CLAIM_CONNECTION:
+        _claim_link = ClaimLink(
+            int(API_ID), API_HASH, keepalive=CLAIM_KEEPALIVE,
+            on_ping=lambda rtt_us: metrics.observe("claim_link_ping", (), rtt_us),
+        )
+    
+    confirmations.start(time.perf_counter)
+    
+    rule_watcher = None
+    if RULES_FILE:
+        rule_watcher = RuleWatcher(RULES_FILE, DEFAULT_RULES, apply_rules, RULES_POLL_INTERVAL)
+        rule_watcher.start()
+    
+    if WATCHDOG_INTERVAL > 0:
+        _watchdog = Watchdog(
+            activity, probe_updates, force_reconnect, is_monitoring,
+            interval=WATCHDOG_INTERVAL, factor=STALL_FACTOR,
+            min_silence=STALL_MIN_SECONDS, max_silence=STALL_MAX_SECONDS,
+        )
+        _watchdog.start()
+    
+    channels_watcher = None
+    if CHANNELS_FILE and CHANNELS_POLL_INTERVAL > 0:
+        channels_watcher = asyncio.create_task(watch_channels_file())
+    
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
+        metrics_server.route("/metrics", render_metrics)
+        metrics_server.route("/healthz", render_healthz)
+        metrics_server.route("/readyz", render_readyz)
+        await metrics_server.start()
+    
     # Auto-restart loop
-    while stats.restarts < MAX_RETRIES:
+    failures = 0
+    while failures < MAX_RETRIES:
         should_restart = await run_client()
         
         if not should_restart:
             break
         
         stats.restarts += 1
-        logger.warning(f"🔄 Перезапуск {stats.restarts}/{MAX_RETRIES} через {RETRY_DELAY}s...")
-        await asyncio.sleep(RETRY_DELAY)
+        if RECONNECT_MODE == "fast":
+            # Only failures in a row count; a run that got to monitoring resets them
+            failures = 0 if _last_run_ready else failures
+            delay = reconnect_delay(failures)
+            failures += 1
+            logger.warning(f"⚡ Переподключение ({failures}/{MAX_RETRIES} подряд) через {delay:.2f}s...")
+        else:
+            failures += 1
+            delay = RETRY_DELAY
+            logger.warning(f"🔄 Перезапуск {stats.restarts}/{MAX_RETRIES} через {RETRY_DELAY}s...")
+        await asyncio.sleep(delay)
     
-    if stats.restarts >= MAX_RETRIES:
+    if failures >= MAX_RETRIES:
         logger.error(f"❌ Превышено максимальное число перезапусков ({MAX_RETRIES})")
     
+    if _claim_link:
+        await _claim_link.stop()
+    
+    confirmations.stop()
+    
+    if _profiler.running:
+        stop_profiler()
+    
+    if _session_flusher:
+        await _session_flusher.stop()
+        flush = metrics.merged("session_flush", phase="write")
+        if flush.count:
+            logger.info(f"🔑 Снимков сессии: {_session_flusher.flushes}, запись p99 "
+                        f"{flush.percentile(99) / 1000:.1f}ms (в фоновом потоке)")
+    
+    if metrics_server:
+        await metrics_server.stop()
+    
+    if channels_watcher:
+        channels_watcher.cancel()
+    if _watchdog:
+        _watchdog.stop()
+        if _watchdog.stalls:
+            logger.info(f"🐕 Зависаний апдейтов: {_watchdog.stalls} (проб: {_watchdog.probes})")
+    
+    await _scheduler.stop()
+    c = _scheduler.counters()
+    if c["dropped"] or c["blocked"] or c["failed"]:
+        logger.info(f"🧵 Очередь: ожидали места {c['blocked']}, отброшено {c['dropped']}, "
+                    f"ошибок {c['failed']}, макс. глубина {c['max_depth']}")
+    
+    if rule_watcher:
+        rule_watcher.stop()
+        unused = rule_hits.unused(rules)
+        if unused:
+            logger.info(f"📜 Правил без срабатываний: {len(unused)}/{len(rules)}")
+    
+    c = _notifier.counters()
+    if c["dropped"] or c["coalesced"]:
+        logger.info(f"📬 Уведомления: отправлено {c['sent']}, объединено {c['coalesced']}, потеряно {c['dropped']}")
+    
+    if _capture:
+        logger.info(f"💾 Записано в корпус: {_capture.count} сообщений")
+        _capture.close()
+    
+    if _log_queue_handler.dropped:
+        logger.warning(f"⚠️ Потеряно записей лога (очередь переполнена): {_log_queue_handler.dropped}")
     logger.info("👋 Goodbye!")
+    stop_logging(_log_listener)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Compact per-message fingerprints of button markup, so an edit can be
+diffed against what we already saw: text-only edits cost one hash compare,
+and only new or changed buttons go through the claim pipeline.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+
+
+def button_hash(btn) -> int:
+    return hash((btn.text, btn.url, btn.data))
+
+
+def fingerprint(rows) -> tuple[int, frozenset]:
+    """(hash of whole markup, set of per-button hashes)."""
+    hashes = tuple(button_hash(btn) for row in rows for btn in row) if rows else ()
+    return hash(hashes), frozenset(hashes)
+
+
+class MarkupTracker:
+    """Bounded LRU map (chat_id, msg_id) -> markup fingerprint."""
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._prints: "OrderedDict[tuple, tuple[int, frozenset]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._prints)
+
+    def remember(self, chat_id: int, msg_id: int, rows):
+        """Store the fingerprint of a message we just processed."""
+        if not rows:
+            return
+        self._store((chat_id, msg_id), fingerprint(rows))
+
+    def diff(self, chat_id: int, msg_id: int, rows) -> Optional[list]:
+        """Return rows with only new/changed buttons, or None if the markup
+        did not change. Updates the stored fingerprint."""
+        key = (chat_id, msg_id)
+        old_print = self._prints.get(key)
+        if not rows and old_print is None:
+            return None  # Text-only edit of a post without buttons: keep the LRU for keyboards
+        new_print = fingerprint(rows)
+        if old_print is not None and old_print[0] == new_print[0]:
+            self._prints.move_to_end(key)
+            return None
+        self._store(key, new_print)
+        if not rows:
+            return None
+        seen = old_print[1] if old_print else frozenset()
+        changed = [[btn for btn in row if button_hash(btn) not in seen] for row in rows]
+        changed = [row for row in changed if row]
+        return changed or None
+
+    def _store(self, key: tuple, value: tuple):
+        self._prints[key] = value
+        self._prints.move_to_end(key)
+        while len(self._prints) > self.maxsize:
+            self._prints.popitem(last=False)
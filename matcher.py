@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled matchers for button text, URLs and start codes.
+All keyword/prefix lists are compiled once at startup, so classifying a
+button costs a single pass over its text instead of one scan per keyword.
+"""
+
+import re
+from typing import Iterable, NamedTuple, Optional
+
+# Button texts repeat a lot across posts ("Получить", "Активировать чек"),
+# so verdicts are memoized; the cache is simply dropped when full
+BUTTON_CACHE_SIZE = 4096
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher compiled into a flat DFA.
+
+    Failure links are folded into the transition table at build time, so
+    scanning is one dict lookup per character and reports every (also
+    overlapping) occurrence of every pattern.
+    """
+
+    __slots__ = ("_delta", "_out")
+
+    def __init__(self, patterns: Iterable[tuple[str, object]]):
+        goto: list[dict] = [{}]
+        out: list[list] = [[]]
+        for word, payload in patterns:
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(payload)
+
+        # Breadth-first walk: every state inherits the transitions and
+        # outputs of its failure state.
+        delta: list[dict] = [dict() for _ in goto]
+        delta[0] = dict(goto[0])
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        while queue:
+            next_queue = []
+            for state in queue:
+                out[state].extend(out[fail[state]])
+                delta[state] = dict(delta[fail[state]])
+                for ch, nxt in goto[state].items():
+                    fail[nxt] = delta[fail[state]].get(ch, 0)
+                    delta[state][ch] = nxt
+                    next_queue.append(nxt)
+            queue = next_queue
+
+        self._delta = tuple(delta)
+        self._out = tuple(tuple(o) for o in out)
+
+    def findall(self, text: str) -> list:
+        """Return payloads of all pattern occurrences in text."""
+        delta = self._delta
+        out = self._out
+        hits = []
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                hits.extend(out[state])
+        return hits
+
+
+class PrefixTrie:
+    """Prefix matcher: returns every registered prefix of a string."""
+
+    __slots__ = ("_root", "_depth")
+
+    def __init__(self, prefixes: Iterable[tuple[str, object]]):
+        self._root: dict = {}
+        self._depth = 0
+        for prefix, payload in prefixes:
+            if not prefix:
+                continue
+            node = self._root
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            # None is never a character, so it is safe as terminal marker
+            node.setdefault(None, []).append(payload)
+            self._depth = max(self._depth, len(prefix))
+
+    def match(self, text: str) -> list:
+        """Return payloads of all prefixes of text, shortest first."""
+        hits = []
+        node = self._root
+        for ch in text[:self._depth]:
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                hits.extend(node[None])
+        return hits
+
+
+# ============================================================================
+# VERDICTS
+# ============================================================================
+# Code kinds in the order they are checked: giveaway wins over ignore,
+# ignore wins over gift
+CODE_GIVEAWAY = "giveaway"
+CODE_IGNORE = "ignore"
+CODE_GIFT = "gift"
+CODE_UNKNOWN = "unknown"
+_CODE_PRIORITY = {CODE_GIVEAWAY: 0, CODE_IGNORE: 1, CODE_GIFT: 2}
+
+
+class ButtonVerdict(NamedTuple):
+    """Result of matching button text against blacklist/whitelist."""
+    blocked: tuple    # matched BLACKLIST words
+    triggers: tuple   # matched WHITELIST words
+
+    @property
+    def is_gift_text(self) -> bool:
+        return bool(self.triggers)
+
+
+class CodeVerdict(NamedTuple):
+    """Result of classifying a start parameter."""
+    kind: str
+    prefix: str = ""
+
+    @property
+    def is_claimable(self) -> bool:
+        return self.kind != CODE_IGNORE
+
+    @property
+    def is_giveaway(self) -> bool:
+        return self.kind == CODE_GIVEAWAY
+
+    @property
+    def reason(self) -> str:
+        if self.kind == CODE_GIVEAWAY:
+            return f"розыгрыш '{self.prefix}'"
+        if self.kind == CODE_IGNORE:
+            return f"игнор-префикс '{self.prefix}'"
+        if self.kind == CODE_GIFT:
+            return f"подарок '{self.prefix}'"
+        return "неизвестный формат (пробуем)"
+
+    @property
+    def code_type(self) -> str:
+        """Short human-readable type for notifications."""
+        if self.kind == CODE_GIVEAWAY:
+            return f"розыгрыш ({self.prefix.rstrip('_')})"
+        if self.kind == CODE_GIFT:
+            return self.prefix.rstrip('_')
+        return "неизвестный"
+
+
+class UrlVerdict(NamedTuple):
+    """Giveaway match in a URL: by URL pattern or by giveaway bot."""
+    kind: str   # "pattern" or "bot"
+    rule: str
+
+    @property
+    def reason(self) -> str:
+        if self.kind == "pattern":
+            return f"паттерн '{self.rule}'"
+        return f"бот @{self.rule}"
+
+
+UNKNOWN_CODE = CodeVerdict(CODE_UNKNOWN)
+EMPTY_BUTTON = ButtonVerdict((), ())
+
+
+class Classifier:
+    """All claim filters compiled into one immutable structure.
+
+    Only the button verdict memo is mutable; it never changes results.
+    """
+
+    __slots__ = ("_words", "_codes", "_urls", "_url_prefilter", "_button_cache")
+
+    def __init__(self, *, blacklist, whitelist, gift_prefixes,
+                 giveaway_prefixes, ignore_prefixes, giveaway_bots,
+                 giveaway_url_patterns):
+        words = [(w.lower(), (True, i, w)) for i, w in enumerate(blacklist)]
+        words += [(w.lower(), (False, i, w)) for i, w in enumerate(whitelist)]
+        self._words = AhoCorasick(words)
+
+        codes = []
+        for kind, prefixes in ((CODE_GIVEAWAY, giveaway_prefixes),
+                               (CODE_IGNORE, ignore_prefixes),
+                               (CODE_GIFT, gift_prefixes)):
+            codes += [(p.lower(), (_CODE_PRIORITY[kind], i, CodeVerdict(kind, p)))
+                      for i, p in enumerate(prefixes)]
+        self._codes = PrefixTrie(codes)
+
+        urls = [(p.lower(), (0, i, UrlVerdict("pattern", p)))
+                for i, p in enumerate(giveaway_url_patterns)]
+        for i, bot in enumerate(giveaway_bots):
+            verdict = UrlVerdict("bot", bot)
+            bot = bot.lower()
+            urls.append((f"t.me/{bot}", (1, i, verdict)))
+            urls.append((f"/{bot}/", (1, i, verdict)))
+        self._urls = AhoCorasick(urls)
+        # Most URLs are not giveaways: reject them with one C-level search
+        # before walking the automaton for the exact (ordered) reason
+        self._url_prefilter = re.compile(
+            "|".join(re.escape(word) for word, _ in urls) or r"(?!)")
+        self._button_cache: dict = {}
+
+    def classify_button(self, text_lower: str) -> ButtonVerdict:
+        """Match lowercased button text against both word lists at once."""
+        cached = self._button_cache.get(text_lower)
+        if cached is not None:
+            return cached
+        hits = self._words.findall(text_lower)
+        if hits:
+            # Keep list order and drop repeats, like the old per-list scans
+            hits = sorted(set(hits))
+            verdict = ButtonVerdict(
+                tuple(w for is_black, _, w in hits if is_black),
+                tuple(w for is_black, _, w in hits if not is_black),
+            )
+        else:
+            verdict = EMPTY_BUTTON
+        if len(self._button_cache) >= BUTTON_CACHE_SIZE:
+            self._button_cache.clear()
+        self._button_cache[text_lower] = verdict
+        return verdict
+
+    def classify_code(self, code: str) -> CodeVerdict:
+        """Classify a start parameter by its prefix."""
+        hits = self._codes.match(code.lower())
+        if not hits:
+            return UNKNOWN_CODE
+        return min(hits, key=lambda h: h[:2])[2]
+
+    def classify_url(self, url_lower: str) -> Optional[UrlVerdict]:
+        """Return giveaway verdict if lowercased URL is a giveaway link."""
+        if not self._url_prefilter.search(url_lower):
+            return None
+        hits = self._urls.findall(url_lower)
+        if not hits:
+            return None
+        return min(hits, key=lambda h: h[:2])[2]
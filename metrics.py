@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Latency histograms and a tiny built-in HTTP server for Prometheus.
+Histograms are HDR-style (log-linear, sparse), so recording is O(1) and
+memory stays small even with many label combinations.
+"""
+
+import asyncio
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 2**SUB_BITS sub-buckets per power of two: ~3% relative error
+SUB_BITS = 5
+
+# Bucket bounds (seconds) exported to Prometheus
+PROM_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """HDR-style histogram of integer microsecond values."""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets: dict[int, int] = {}   # bucket lower bound -> count
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_us: int):
+        if value_us < 0:
+            value_us = 0
+        shift = value_us.bit_length() - SUB_BITS
+        lower = (value_us >> shift) << shift if shift > 0 else value_us
+        self.buckets[lower] = self.buckets.get(lower, 0) + 1
+        self.count += 1
+        self.total += value_us
+        if value_us > self.max:
+            self.max = value_us
+
+    def percentile(self, pct: float) -> int:
+        """Value (us) at the given percentile, to bucket precision."""
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * pct / 100 + 0.999999))
+        seen = 0
+        for lower in sorted(self.buckets):
+            seen += self.buckets[lower]
+            if seen >= target:
+                return min(lower, self.max)
+        return self.max
+
+    def cumulative(self, bounds_us) -> list[int]:
+        """Counts of values below each bound (for Prometheus 'le')."""
+        result = []
+        items = sorted(self.buckets.items())
+        idx = 0
+        seen = 0
+        for bound in bounds_us:
+            while idx < len(items) and items[idx][0] <= bound:
+                seen += items[idx][1]
+                idx += 1
+            result.append(seen)
+        return result
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """Registry of labelled histograms plus counters/gauges providers."""
+
+    def __init__(self, prefix: str = "claimer"):
+        self.prefix = prefix
+        self._histograms: dict[str, tuple[tuple, dict]] = {}
+        self._help: dict[str, str] = {}
+        self._providers: list[Callable[[], dict]] = []
+
+    def histogram(self, name: str, label_names: tuple, help_text: str = ""):
+        """Declare a histogram family."""
+        self._histograms.setdefault(name, (label_names, {}))
+        self._help[name] = help_text
+
+    def observe(self, name: str, labels: tuple, value_us: int):
+        series = self._histograms[name][1]
+        hist = series.get(labels)
+        if hist is None:
+            hist = series[labels] = Histogram()
+        hist.record(value_us)
+
+    def series(self, name: str) -> dict:
+        return self._histograms[name][1]
+
+    def merged(self, name: str, **match) -> Histogram:
+        """One histogram merging all series whose labels match."""
+        label_names, series = self._histograms[name]
+        merged = Histogram()
+        for labels, hist in series.items():
+            if any(labels[label_names.index(k)] != v for k, v in match.items()):
+                continue
+            for lower, count in hist.buckets.items():
+                merged.buckets[lower] = merged.buckets.get(lower, 0) + count
+            merged.count += hist.count
+            merged.total += hist.total
+            merged.max = max(merged.max, hist.max)
+        return merged
+
+    def add_provider(self, provider: Callable[[], dict]):
+        """Register a callable returning {name: (type, help, value)}."""
+        self._providers.append(provider)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        for provider in self._providers:
+            for name, (kind, help_text, value) in provider().items():
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} {kind}")
+                if isinstance(value, dict):
+                    for label_values, v in value.items():
+                        lines.append(f"{full}{label_values} {v}")
+                else:
+                    lines.append(f"{full} {value}")
+
+        bounds_us = [int(b * 1_000_000) for b in PROM_BUCKETS]
+        for name, (label_names, series) in self._histograms.items():
+            full = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# HELP {full} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {full} histogram")
+            for labels, hist in list(series.items()):
+                for bound, seen in zip(PROM_BUCKETS, hist.cumulative(bounds_us)):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{full}_bucket{_labels(label_names, labels, le)} {seen}")
+                le = 'le="+Inf"'
+                lines.append(f"{full}_bucket{_labels(label_names, labels, le)} {hist.count}")
+                lines.append(f"{full}_sum{_labels(label_names, labels)} {hist.total / 1_000_000:.6f}")
+                lines.append(f"{full}_count{_labels(label_names, labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Minimal HTTP/1.0 server on the event loop. Routes return
+    (status, content_type, body)."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.routes: dict[str, Callable[[], tuple[int, str, str]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, path: str, handler: Callable[[], tuple[int, str, str]]):
+        self.routes[path] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"📈 HTTP сервер метрик: http://{self.host}:{self.port} ({', '.join(self.routes)})")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain headers, we don't need them
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) > 1 else "/"
+            handler = self.routes.get(path)
+            if handler:
+                status, content_type, body = handler()
+            else:
+                status, content_type, body = 404, "text/plain", "not found\n"
+            payload = body.encode("utf-8")
+            reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}.get(status, "OK")
+            writer.write(
+                f"HTTP/1.0 {status} {reason}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"HTTP запрос не обработан: {e}")
+        finally:
+            writer.close()
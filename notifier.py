@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Background notifier: notifications are queued, coalesced into digests and
+sent only while no claim RPC is in flight, so Saved Messages writes never
+compete with claims for the connection or the flood budget.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Telegram message length limit
+MAX_MESSAGE_LEN = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+class Notifier:
+    """Bounded, coalescing notification queue drained by one task."""
+
+    def __init__(self, send: Callable[[str, bool], Awaitable], *,
+                 window: float = 2.0, max_queue: int = 100, max_batch: int = 10,
+                 is_busy: Optional[Callable[[], bool]] = None,
+                 max_defer: float = 10.0, busy_poll: float = 0.05):
+        self._send = send
+        self.window = window
+        self.max_batch = max_batch
+        self.max_defer = max_defer
+        self.busy_poll = busy_poll
+        self._is_busy = is_busy or (lambda: False)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.sent = 0           # messages actually sent
+        self.dropped = 0        # queue full
+        self.coalesced = 0      # events merged into another message
+        self.deferred = 0       # digests that waited for claims to finish
+        self.failed = 0
+
+    def submit(self, text: str, silent: bool = False) -> bool:
+        """Queue a notification without blocking. False if dropped."""
+        try:
+            self._queue.put_nowait((text, silent))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, flush_timeout: float = 5.0):
+        """Stop the loop, trying to send what is still queued."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(flush_timeout)
+
+    async def flush(self, timeout: float = 5.0):
+        """Send everything queued right now, bypassing window and defer."""
+        batch = self._drain(self._queue.qsize())
+        if not batch:
+            return
+        try:
+            await asyncio.wait_for(self._deliver(batch), timeout)
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Уведомления не отправлены: {e}")
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+
+            # Coalescing window: collect what arrives in the next few seconds
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Claims have priority: wait until none is in flight
+            if self._is_busy():
+                self.deferred += 1
+                defer_until = time.monotonic() + self.max_defer
+                while self._is_busy() and time.monotonic() < defer_until:
+                    await asyncio.sleep(self.busy_poll)
+
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"⚠️ Не удалось отправить уведомление: {e}")
+
+    async def _deliver(self, batch: list):
+        silent = all(item_silent for _, item_silent in batch)
+        texts = [text for text, _ in batch]
+        if len(texts) > 1:
+            self.coalesced += len(texts) - 1
+            header = f"📬 **Сводка: {len(texts)} событий**"
+            texts = [header] + texts
+        for chunk in _split(texts):
+            await self._send(chunk, silent)
+            self.sent += 1
+            logger.debug(f"📤 Уведомление отправлено: {chunk[:50]}...")
+
+    def counters(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "deferred": self.deferred,
+            "failed": self.failed,
+            "queued": self._queue.qsize(),
+        }
+
+
+def _split(texts: list) -> list:
+    """Join texts into as few messages as fit Telegram's length limit."""
+    chunks = []
+    current = ""
+    for text in texts:
+        text = text[:MAX_MESSAGE_LEN]
+        candidate = f"{current}{DIGEST_SEPARATOR}{text}" if current else text
+        if len(candidate) > MAX_MESSAGE_LEN:
+            chunks.append(current)
+            current = text
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
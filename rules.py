@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative filter rules (TOML or JSON) compiled into an immutable RuleSet.
+RuleWatcher reloads the file on SIGHUP or when it changes on disk and
+hands the new RuleSet over for an atomic swap; the client stays connected.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+from collections import Counter
+from typing import Callable, Optional
+
+from matcher import CODE_GIFT, CODE_GIVEAWAY, CODE_IGNORE, Classifier
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
+RULE_LISTS = (
+    "gift_code_prefixes",
+    "giveaway_code_prefixes",
+    "ignore_code_prefixes",
+    "giveaway_bots",
+    "giveaway_url_patterns",
+    "blacklist",
+    "whitelist",
+)
+
+# Which list a CodeVerdict kind / UrlVerdict kind came from
+CODE_KIND_LISTS = {
+    CODE_GIFT: "gift_code_prefixes",
+    CODE_GIVEAWAY: "giveaway_code_prefixes",
+    CODE_IGNORE: "ignore_code_prefixes",
+}
+URL_KIND_LISTS = {"pattern": "giveaway_url_patterns", "bot": "giveaway_bots"}
+
+
+class RulesError(ValueError):
+    pass
+
+
+class RuleSet:
+    """Immutable rule lists plus the classifier compiled from them."""
+
+    __slots__ = ("lists", "classifier", "source")
+
+    def __init__(self, lists: dict, source: str):
+        self.lists = {name: tuple(lists[name]) for name in RULE_LISTS}
+        self.source = source
+        self.classifier = Classifier(
+            blacklist=self.lists["blacklist"],
+            whitelist=self.lists["whitelist"],
+            gift_prefixes=self.lists["gift_code_prefixes"],
+            giveaway_prefixes=self.lists["giveaway_code_prefixes"],
+            ignore_prefixes=self.lists["ignore_code_prefixes"],
+            giveaway_bots=self.lists["giveaway_bots"],
+            giveaway_url_patterns=self.lists["giveaway_url_patterns"],
+        )
+
+    def __len__(self):
+        return sum(len(rules) for rules in self.lists.values())
+
+
+def read_rules_file(path: str) -> dict:
+    """Parse a .toml or .json rules file into a dict."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise RulesError("TOML rules need Python 3.11+ (or use .json)")
+        return tomllib.loads(raw.decode("utf-8"))
+    return json.loads(raw.decode("utf-8"))
+
+
+def build_rules(data: dict, defaults: dict, source: str) -> RuleSet:
+    """Validate data and compile it; lists missing from data use defaults."""
+    unknown = set(data) - set(RULE_LISTS)
+    if unknown:
+        raise RulesError(f"unknown keys: {', '.join(sorted(unknown))}")
+    lists = {}
+    for name in RULE_LISTS:
+        value = data.get(name, defaults[name])
+        if not isinstance(value, (list, tuple)) or not all(isinstance(v, str) and v for v in value):
+            raise RulesError(f"'{name}' must be a list of non-empty strings")
+        lists[name] = value
+    return RuleSet(lists, source)
+
+
+def load_rules(path: str, defaults: dict) -> RuleSet:
+    return build_rules(read_rules_file(path), defaults, path)
+
+
+class RuleHits:
+    """Hit counters per (list, rule); kept across reloads."""
+
+    def __init__(self):
+        self._hits: Counter = Counter()
+
+    def record(self, list_name: str, rule: str):
+        self._hits[(list_name, rule)] += 1
+
+    def counts(self, ruleset: RuleSet) -> dict:
+        """{(list, rule): hits} for every rule in ruleset, zeros included."""
+        return {(name, rule): self._hits.get((name, rule), 0)
+                for name, rules in ruleset.lists.items() for rule in rules}
+
+    def unused(self, ruleset: RuleSet) -> list:
+        return [key for key, hits in self.counts(ruleset).items() if not hits]
+
+
+class RuleWatcher:
+    """Reloads rules on SIGHUP or file change and calls on_reload(ruleset)."""
+
+    def __init__(self, path: str, defaults: dict, on_reload: Callable[[RuleSet], None],
+                 poll_interval: float = 5.0):
+        self.path = path
+        self.defaults = defaults
+        self.on_reload = on_reload
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self.failures = 0
+        self._mtime = self._current_mtime()
+        self._task: Optional[asyncio.Task] = None
+
+    def _current_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    async def reload(self, reason: str) -> bool:
+        """Parse and compile off the loop thread, then swap in the result."""
+        try:
+            ruleset = await asyncio.to_thread(load_rules, self.path, self.defaults)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ Правила {self.path} не загружены ({reason}): {e} — оставляю старые")
+            return False
+        self.on_reload(ruleset)
+        self.reloads += 1
+        logger.info(f"📜 Правила перезагружены ({reason}): {len(ruleset)} правил")
+        return True
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(self.reload("SIGHUP")))
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass  # No SIGHUP on this platform; file polling still works
+        if self.poll_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._poll())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            mtime = self._current_mtime()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                await self.reload("файл изменен")
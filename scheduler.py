@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed pool of workers fed by a bounded priority queue, replacing one
+create_task per update. Posts that look claimable jump the queue; posts
+without buttons go to a separate cheap lane that drops under overload
+instead of competing with check posts.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_CLAIM = 0      # markup with callback data or a start link
+PRIORITY_BUTTONS = 1    # other buttons (edits, plain links)
+
+LANE_MAIN = "main"
+LANE_CHEAP = "cheap"
+
+
+class Scheduler:
+    """Priority lane with backpressure plus a lossy lane for cheap work.
+
+    Jobs are (coroutine function, args) so a dropped job never leaves an
+    un-awaited coroutine behind. on_wait(lane, wait_us) is called when a
+    worker picks a job up.
+    """
+
+    def __init__(self, workers: int = 8, max_queue: int = 1000,
+                 cheap_workers: int = 1, cheap_queue: int = 1000,
+                 on_wait: Optional[Callable[[str, int], None]] = None):
+        self.workers = workers
+        self.cheap_workers = cheap_workers
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_queue)
+        self._cheap: asyncio.Queue = asyncio.Queue(maxsize=cheap_queue)
+        self._on_wait = on_wait or (lambda lane, wait_us: None)
+        self._seq = itertools.count()  # FIFO within one priority
+        self._tasks: list[asyncio.Task] = []
+
+        self.submitted = 0
+        self.blocked = 0        # submits that had to wait for queue space
+        self.dropped = 0        # cheap-lane jobs dropped (queue full)
+        self.done = 0
+        self.failed = 0
+        self.busy = 0           # jobs running right now
+        self.max_depth = 0
+
+    async def submit(self, priority: int, func: Callable[..., Awaitable], *args):
+        """Queue a job; waits while the queue is full. That only throttles
+        intake if the caller is the one update loop (sequential_updates)."""
+        item = (priority, next(self._seq), time.perf_counter(), func, args)
+        if self._queue.full():
+            self.blocked += 1
+        await self._queue.put(item)
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def submit_cheap(self, func: Callable[..., Awaitable], *args) -> bool:
+        """Queue low-value work without blocking. False if dropped."""
+        try:
+            self._cheap.put_nowait((0, 0, time.perf_counter(), func, args))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(self._queue, LANE_MAIN))
+                       for _ in range(self.workers)]
+        self._tasks += [asyncio.create_task(self._worker(self._cheap, LANE_CHEAP))
+                        for _ in range(self.cheap_workers)]
+
+    async def stop(self):
+        """Cancel the workers; jobs still queued are discarded."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, queue: asyncio.Queue, lane: str):
+        while True:
+            _, _, enqueued, func, args = await queue.get()
+            self._on_wait(lane, int((time.perf_counter() - enqueued) * 1e6))
+            self.busy += 1
+            try:
+                await func(*args)
+                self.done += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"💥 Ошибка обработки ({lane}): {e}", exc_info=True)
+            finally:
+                self.busy -= 1
+                queue.task_done()
+
+    def depth(self, lane: str = LANE_MAIN) -> int:
+        return (self._queue if lane == LANE_MAIN else self._cheap).qsize()
+
+    def counters(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "blocked": self.blocked,
+            "dropped": self.dropped,
+            "done": self.done,
+            "failed": self.failed,
+            "busy": self.busy,
+            "depth_main": self.depth(LANE_MAIN),
+            "depth_cheap": self.depth(LANE_CHEAP),
+            "max_depth": self.max_depth,
+        }
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Telethon session kept entirely in memory and snapshotted to a JSON file
+from a background thread, so entity and update-state writes never hit
+SQLite on the event loop. The first start migrates an existing .session
+file or a STRING_SESSION (generate_session.py output).
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, StringSession
+from telethon.tl.types.updates import State
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotSession(MemorySession):
+    """MemorySession that tracks changes and round-trips through a dict."""
+
+    def __init__(self):
+        super().__init__()
+        self.dirty = False
+
+    # Everything that changes persistent state marks the session dirty
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self.dirty = True
+
+    @property
+    def auth_key(self):
+        return self._auth_key
+
+    @auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self.dirty = True
+
+    @property
+    def takeout_id(self):
+        return self._takeout_id
+
+    @takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self.dirty = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self.dirty = True
+
+    def process_entities(self, tlo):
+        before = len(self._entities)
+        super().process_entities(tlo)
+        if len(self._entities) != before:
+            self.dirty = True
+
+    def to_dict(self) -> dict:
+        """Plain copy of the state; cheap enough to take on the loop."""
+        return {
+            "version": SNAPSHOT_VERSION,
+            "dc_id": self._dc_id,
+            "server_address": self._server_address,
+            "port": self._port,
+            "auth_key": self._auth_key.key if self._auth_key else None,
+            "takeout_id": self._takeout_id,
+            "entities": list(self._entities),
+            "update_states": [
+                (entity_id, state.pts, state.qts, state.date.timestamp(), state.seq)
+                for entity_id, state in self._update_states.items()
+            ],
+        }
+
+    def load_dict(self, data: dict):
+        self._dc_id = data.get("dc_id") or 0
+        self._server_address = data.get("server_address")
+        self._port = data.get("port")
+        key = data.get("auth_key")
+        self._auth_key = AuthKey(base64.b64decode(key)) if key else None
+        self._takeout_id = data.get("takeout_id")
+        self._entities = {tuple(row) for row in data.get("entities", ())}
+        self._update_states = {
+            entity_id: State(pts, qts, datetime.fromtimestamp(date, tz=timezone.utc), seq, 0)
+            for entity_id, pts, qts, date, seq in data.get("update_states", ())
+        }
+        self.dirty = False
+
+    def copy_auth_from(self, other):
+        """Take DC and auth key from another session (e.g. StringSession)."""
+        self.set_dc(other.dc_id, other.server_address, other.port)
+        self.auth_key = other.auth_key
+
+
+def write_snapshot(path: str, data: dict):
+    """Serialize and write atomically, readable by the owner only."""
+    data = dict(data)
+    if data["auth_key"] is not None:
+        data["auth_key"] = base64.b64encode(data["auth_key"]).decode("ascii")
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def migrate_sqlite(session: SnapshotSession, path: str) -> bool:
+    """Copy auth, entities and update state out of a Telethon .session file."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("select dc_id, server_address, port, auth_key, takeout_id from sessions").fetchone()
+        if not row:
+            return False
+        dc_id, server_address, port, key, takeout_id = row
+        session.set_dc(dc_id, server_address, port)
+        session.auth_key = AuthKey(key) if key else None
+        session.takeout_id = takeout_id
+        session._entities = {
+            tuple(r) for r in conn.execute("select id, hash, username, phone, name from entities")
+        }
+        try:
+            for entity_id, pts, qts, date, seq in conn.execute("select id, pts, qts, date, seq from update_state"):
+                session._update_states[entity_id] = State(
+                    pts, qts, datetime.fromtimestamp(date, tz=timezone.utc), seq, 0)
+        except sqlite3.OperationalError:
+            pass  # Old files without update_state
+    finally:
+        conn.close()
+    session.dirty = True
+    return True
+
+
+def open_session(path: str, *, sqlite_path: str = "", string: str = "") -> tuple[SnapshotSession, str]:
+    """Build the session from the snapshot, or migrate it on first start.
+
+    Returns (session, source) where source is "snapshot", "string",
+    "sqlite" or "new". A STRING_SESSION with a different auth key than the
+    snapshot wins, so switching accounts through the env var still works.
+    """
+    session = SnapshotSession()
+    seed = StringSession(string) if string else None
+
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                session.load_dict(json.load(f))
+            if seed is None or (session.auth_key and seed.auth_key
+                                and session.auth_key.key == seed.auth_key.key):
+                return session, "snapshot"
+            logger.warning(f"⚠️ STRING_SESSION не совпадает со снимком {path} — беру STRING_SESSION")
+            session = SnapshotSession()
+        except Exception as e:
+            logger.warning(f"⚠️ Снимок сессии {path} не прочитан: {e}")
+            session = SnapshotSession()
+
+    if seed is not None:
+        session.copy_auth_from(seed)
+        return session, "string"
+    if sqlite_path and os.path.exists(sqlite_path):
+        try:
+            if migrate_sqlite(session, sqlite_path):
+                return session, "sqlite"
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось перенести {sqlite_path}: {e}")
+            session = SnapshotSession()
+    return session, "new"
+
+
+class SessionFlusher:
+    """Writes the session snapshot periodically and on stop, off the loop.
+
+    on_flush(copy_us, write_us) reports how long the in-loop copy and the
+    threaded write took.
+    """
+
+    def __init__(self, session: SnapshotSession, path: str, interval: float = 60.0,
+                 on_flush: Optional[Callable[[int, int], None]] = None):
+        self.session = session
+        self.path = path
+        self.interval = interval
+        self.on_flush = on_flush or (lambda copy_us, write_us: None)
+        self.flushes = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def flush(self, force: bool = False) -> bool:
+        """Write a snapshot if anything changed. False if nothing was written."""
+        async with self._lock:
+            if not (self.session.dirty or force):
+                return False
+            started = time.perf_counter()
+            data = self.session.to_dict()
+            self.session.dirty = False
+            copied = time.perf_counter()
+            try:
+                await asyncio.to_thread(write_snapshot, self.path, data)
+            except Exception as e:
+                self.session.dirty = True
+                self.failures += 1
+                logger.warning(f"⚠️ Снимок сессии не сохранен: {e}")
+                return False
+            written = time.perf_counter()
+            self.flushes += 1
+            self.on_flush(int((copied - started) * 1e6), int((written - copied) * 1e6))
+            return True
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
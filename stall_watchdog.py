@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Stall detection for the update stream. Per-channel arrival rates say how
+long a silence is normal; a longer silence triggers a cheap probe, and a
+failed probe (dead connection, or the channel has posts we never got)
+asks for a reconnect. Also tracks event-loop lag for the health endpoints.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityModel:
+    """EWMA of the gap between updates, per chat."""
+
+    __slots__ = ("alpha", "last_update", "_last", "_gap")
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.last_update: Optional[float] = None   # perf_counter
+        self._last: dict[int, float] = {}
+        self._gap: dict[int, float] = {}
+
+    def record(self, chat_id: int, now: float):
+        """Hot path: one update from chat_id at perf_counter time now."""
+        self.last_update = now
+        last = self._last.get(chat_id)
+        self._last[chat_id] = now
+        if last is not None:
+            gap = self._gap.get(chat_id)
+            self._gap[chat_id] = now - last if gap is None else gap + self.alpha * (now - last - gap)
+
+    def expected_gap(self) -> Optional[float]:
+        """Typical gap between updates across all chats, None if unknown."""
+        rate = sum(1.0 / gap for gap in self._gap.values() if gap > 0)
+        return 1.0 / rate if rate else None
+
+    def most_active(self) -> Optional[int]:
+        if not self._gap:
+            return next(iter(self._last), None)
+        return min(self._gap, key=self._gap.get)
+
+    def silence(self, now: float) -> float:
+        return now - self.last_update if self.last_update is not None else 0.0
+
+
+class Watchdog:
+    """Periodic check: measure loop lag, probe when updates are silent too long.
+
+    probe() returns (healthy, reason); on_stall(reason) is called when it is
+    not healthy or does not answer within probe_timeout.
+    """
+
+    def __init__(self, model: ActivityModel,
+                 probe: Callable[[], Awaitable[tuple[bool, str]]],
+                 on_stall: Callable[[str], None],
+                 is_active: Callable[[], bool],
+                 *, interval: float = 15.0, factor: float = 20.0,
+                 min_silence: float = 120.0, max_silence: float = 1800.0,
+                 probe_timeout: float = 10.0):
+        self.model = model
+        self.probe = probe
+        self.on_stall = on_stall
+        self.is_active = is_active
+        self.interval = interval
+        self.factor = factor
+        self.min_silence = min_silence
+        self.max_silence = max_silence
+        self.probe_timeout = probe_timeout
+
+        self.last_tick: Optional[float] = None
+        self.loop_lag = 0.0
+        self.probes = 0
+        self.stalls = 0
+        self._quiet_since: Optional[float] = None  # silence already probed
+        self._probed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def threshold(self) -> float:
+        """Seconds of silence that count as suspicious right now."""
+        gap = self.model.expected_gap()
+        if gap is None:
+            return self.max_silence
+        return min(self.max_silence, max(self.min_silence, self.factor * gap))
+
+    def start(self):
+        self.last_tick = time.perf_counter()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def alive(self, now: Optional[float] = None) -> bool:
+        """The check loop ran recently (the event loop is not wedged)."""
+        now = now or time.perf_counter()
+        return self.last_tick is not None and now - self.last_tick < 3 * self.interval
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.loop_lag = max(0.0, now - started - self.interval)
+            self.last_tick = now
+            if not self.is_active():
+                self._quiet_since = None
+                continue
+            try:
+                await self.check(now)
+            except Exception as e:
+                logger.warning(f"⚠️ Watchdog: ошибка проверки: {e}")
+
+    async def check(self, now: float):
+        last = self.model.last_update
+        if last is None or self.model.silence(now) < self.threshold():
+            return
+        # Same silence already probed: re-probe only after another threshold
+        if self._quiet_since == last and now - self._probed_at < self.threshold():
+            return
+        self.probes += 1
+        self._probed_at = now
+        try:
+            healthy, reason = await asyncio.wait_for(self.probe(), self.probe_timeout)
+        except Exception as e:
+            healthy, reason = False, f"проба не ответила: {e or type(e).__name__}"
+        self._quiet_since = last
+        if healthy:
+            logger.info(f"🐕 Тишина {int(self.model.silence(now))}s, но соединение живое: {reason}")
+            return
+        self.stalls += 1
+        self.on_stall(reason)
+
+    def status(self, now: Optional[float] = None) -> dict:
+        now = now or time.perf_counter()
+        return {
+            "alive": self.alive(now),
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "silence_s": round(self.model.silence(now), 1),
+            "threshold_s": round(self.threshold(), 1),
+            "probes": self.probes,
+            "stalls": self.stalls,
+        }